@@ -33,6 +33,9 @@ import logging
 import os
 import os.path as osp
 import sys
+import time
+
+import numpy as np
 
 import tensorflow as tf
 
@@ -146,3 +149,28 @@ class SiameseTracker:
         """
         reported_bbox = self.tracker.track(self.sess, frame)
         return reported_bbox
+
+    def warmup(self, frame_shape=(480, 640), iterations=3):
+        """
+        Track a synthetic target before the real one.
+
+        The first session runs allocate memory and pick kernels. The state
+        left behind is reset by the next `set_first_frame()`.
+
+        Args:
+            frame_shape (tuple): (height, width) of the frames to come
+            iterations (int): Number of warm frames timed
+
+        Returns:
+            tuple: Seconds taken by the first `track()` call, and on average
+            by the last `iterations` ones
+        """
+        height, width = frame_shape
+        frame = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        self.set_first_frame(frame, [width // 2 - width // 8, height // 2 - height // 8, width // 4, height // 4])
+        timings = []
+        for _ in range(1 + iterations):
+            start = time.time()
+            self.track(frame)
+            timings.append(time.time() - start)
+        return timings[0], float(np.mean(timings[-iterations:]))
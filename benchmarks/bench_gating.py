@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+r"""Microbenchmark of the Mahalanobis gating of the DeepSORT cost matrix
+
+Compares `linear_assignment.gate_cost_matrix`, which gates the whole
+tracks x detections matrix with one batched call, to the former loop calling
+`KalmanFilter.gating_distance` once per track.
+
+Usage: python benchmarks/bench_gating.py [--counts 10,100,1000] [--repeat 5]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import os.path as osp
+import sys
+import time
+
+import numpy as np
+
+CURRENT_DIR = osp.dirname(__file__)
+sys.path.append(osp.join(CURRENT_DIR, '..'))
+
+from deep_sort.sort import kalman_filter, linear_assignment
+from deep_sort.sort.detection import Detection
+from deep_sort.sort.track import TrackTable
+
+
+def random_scene(kf, n, m, seed=0):
+  """n predicted tracks and m detections in a 1920x1080 frame."""
+  rng = np.random.RandomState(seed)
+  table = TrackTable()
+  for i in range(n):
+    measurement = np.array([rng.uniform(0, 1920), rng.uniform(0, 1080),
+                            rng.uniform(0.3, 0.7), rng.uniform(40, 400)])
+    mean, covariance = kf.initiate(measurement)
+    table.add(mean, covariance, i, 3, 30)
+  table.mean, table.covariance = kf.predict_batch(table.mean, table.covariance)
+  # detections near a random subset of the tracks
+  xyah = table.mean[rng.randint(max(n, 1), size=m) % max(n, 1), :4] + rng.normal(0, 5, (m, 4))
+  xyah[:, 2] = np.clip(xyah[:, 2], 0.2, 1.)
+  tlwh = np.stack([xyah[:, 0] - xyah[:, 2] * xyah[:, 3] / 2, xyah[:, 1] - xyah[:, 3] / 2,
+                   xyah[:, 2] * xyah[:, 3], xyah[:, 3]], axis=1)
+  detections = [Detection(box, 1., np.zeros(1)) for box in tlwh]
+  return table.views(), detections
+
+
+def gate_cost_matrix_loop(kf, cost_matrix, tracks, detections, track_indices, detection_indices,
+                          gated_cost=linear_assignment.INFTY_COST, only_position=False):
+  """The per-track gating loop replaced by the batched version."""
+  gating_threshold = kalman_filter.chi2inv95[2 if only_position else 4]
+  measurements = np.asarray([detections[i].to_xyah() for i in detection_indices])
+  for row, track_idx in enumerate(track_indices):
+    track = tracks[track_idx]
+    gating_distance = kf.gating_distance(track.mean, track.covariance, measurements, only_position)
+    cost_matrix[row, gating_distance > gating_threshold] = gated_cost
+  return cost_matrix
+
+
+def time_gating(gate, kf, tracks, detections, only_position, repeat):
+  track_indices, detection_indices = list(range(len(tracks))), list(range(len(detections)))
+  start = time.time()
+  for _ in range(repeat):
+    cost_matrix = gate(kf, np.zeros((len(tracks), len(detections))), tracks, detections,
+                       track_indices, detection_indices, only_position=only_position)
+  return (time.time() - start) / repeat, cost_matrix
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--counts', type=str, default='10,100,1000',
+                      help='track counts, with as many detections')
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--only_position', action='store_true')
+  args = parser.parse_args()
+
+  kf = kalman_filter.KalmanFilter()
+  gates = [('loop', gate_cost_matrix_loop), ('batched', linear_assignment.gate_cost_matrix)]
+  print('{:>8s}'.format('tracks') + ''.join('{:>18s}'.format(name) for name, _ in gates) +
+        '{:>10s}'.format('speedup'))
+  for n in [int(c) for c in args.counts.split(',')]:
+    tracks, detections = random_scene(kf, n, n)
+    reference, seconds = None, []
+    row = '{:>8d}'.format(n)
+    for _, gate in gates:
+      elapsed, cost_matrix = time_gating(gate, kf, tracks, detections, args.only_position, args.repeat)
+      if reference is None:
+        reference = cost_matrix
+      mark = '' if np.array_equal(cost_matrix, reference) else ' (!)'
+      row += '{:>18s}'.format('{:.3f} ms{}'.format(1000 * elapsed, mark))
+      seconds.append(elapsed)
+    print(row + '{:>10s}'.format('{:.1f}x'.format(seconds[0] / seconds[1])))
+  print('(!) marks a gating that gated different entries than the loop')
+
+
+if __name__ == '__main__':
+  main()
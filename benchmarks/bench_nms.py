@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+r"""Microbenchmark of the NMS backends used by the YOLOv3 detector
+
+Usage: python benchmarks/bench_nms.py [--counts 100,1000,5000] [--repeat 5]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import os.path as osp
+import sys
+import time
+
+import torch
+
+CURRENT_DIR = osp.dirname(__file__)
+sys.path.append(osp.join(CURRENT_DIR, '..', 'detector', 'YOLOv3'))
+
+from nms.nms import BACKENDS
+
+
+def random_boxes(n, seed=0):
+  """Random `xyxy` boxes in a 416x416 image, clustered like YOLO candidates."""
+  g = torch.Generator().manual_seed(seed)
+  centers = torch.rand(max(n // 20, 1), 2, generator=g) * 416
+  xy = centers[torch.randint(len(centers), (n,), generator=g)] + torch.randn(n, 2, generator=g) * 8
+  wh = torch.rand(n, 2, generator=g) * 60 + 10
+  boxes = torch.cat([xy - wh / 2, xy + wh / 2], dim=1)
+  scores = torch.rand(n, generator=g)
+  return boxes, scores
+
+
+def time_backend(nms, boxes, scores, nms_thresh, repeat):
+  nms(boxes, scores, nms_thresh)  # warm up, e.g. numba compilation
+  start = time.time()
+  for _ in range(repeat):
+    keep = nms(boxes, scores, nms_thresh)
+  return (time.time() - start) / repeat, keep
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--counts', type=str, default='100,1000,5000,10000')
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--nms_thresh', type=float, default=0.45)
+  parser.add_argument('--max_python_count', type=int, default=1000,
+                      help='skip the pure python backend above this box count')
+  args = parser.parse_args()
+
+  names = list(BACKENDS)
+  print('{:>8s}'.format('boxes') + ''.join('{:>18s}'.format(name) for name in names))
+  for n in [int(c) for c in args.counts.split(',')]:
+    boxes, scores = random_boxes(n)
+    reference = None
+    row = '{:>8d}'.format(n)
+    for name in names:
+      if name == 'python' and n > args.max_python_count:
+        row += '{:>18s}'.format('skipped')
+        continue
+      seconds, keep = time_backend(BACKENDS[name], boxes, scores, args.nms_thresh, args.repeat)
+      kept = set(keep.tolist())
+      if reference is None:
+        reference = kept
+      mark = '' if kept == reference else ' (!)'
+      row += '{:>18s}'.format('{:.3f} ms{}'.format(1000 * seconds, mark))
+    print(row)
+  print('(!) marks a backend that kept a different set of boxes than the first one')
+
+
+if __name__ == '__main__':
+  main()
@@ -2,14 +2,16 @@ import torch
 import torchvision.transforms as transforms
 import numpy as np
 import cv2
+import time
 
 from .model import Net
+from .weight_cache import load_state_dict_cached
 
 class Extractor(object):
     def __init__(self, model_path, use_cuda=True):
         self.net = Net(reid=True)
         self.device = "cuda" if torch.cuda.is_available() and use_cuda else "cpu"
-        state_dict = torch.load(model_path, map_location=lambda storage, loc: storage)['net_dict']
+        state_dict = load_state_dict_cached(model_path, 'net_dict')
         self.net.load_state_dict(state_dict)
         print("Loading weights from {}... Done!".format(model_path))
         self.net.to(self.device)
@@ -44,6 +46,24 @@ class Extractor(object):
             features = self.net(im_batch)
         return features.cpu().numpy()
 
+    def warmup(self, batch_size=8, iterations=3):
+        """
+        Run synthetic crops through the network, `batch_size` and one at a
+        time, so the first detections are not slowed down by lazy
+        allocations and kernel selection.
+
+        Returns:
+            tuple: Seconds taken by the first call, and on average by the
+            last `iterations` calls, all of `batch_size` crops
+        """
+        crop = np.random.randint(0, 256, (self.size[1], self.size[0], 3), dtype=np.uint8)
+        timings = []
+        for n in [batch_size, 1] + [batch_size] * iterations:
+            start = time.time()
+            self([crop] * n)
+            timings.append(time.time() - start)
+        return timings[0], float(np.mean(timings[-iterations:]))
+
 
 if __name__ == '__main__':
     img = cv2.imread("demo.jpg")[:,:,(2,1,0)]
@@ -0,0 +1,131 @@
+"""
+Memory-mappable cache of PyTorch state dicts.
+
+`torch.load` unpickles the whole checkpoint at every start. The first load
+converts the state dict into one flat .npy blob plus a json index, stored
+next to the checkpoint and named after a hash of its contents. Later loads
+map the blob and return tensors that are zero-copy views of it, and a
+retrained checkpoint gets a new hash and therefore a fresh cache.
+
+Hashing the checkpoint reads it whole, which costs as much as `torch.load`.
+The hash is therefore kept in a small sidecar file together with the size,
+mtime and inode of the checkpoint, and only computed again when they change.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+
+_ALIGN = 64  # byte alignment of every tensor in the blob
+_VERSION = 2  # bumped on layout fixes, so caches written before are ignored
+
+
+def file_digest(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def cached_digest(path):
+    """
+    Content hash of `path`, computed only when the size, mtime or inode of
+    the file differ from the ones stored with the hash in `<path>.sha1.json`.
+    """
+    st = os.stat(path)
+    key = [st.st_size, st.st_mtime_ns, st.st_ino]
+    sidecar = path + ".sha1.json"
+    try:
+        with open(sidecar, 'r') as fp:
+            entry = json.load(fp)
+        if entry['key'] == key:
+            return entry['digest']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    digest = file_digest(path)
+    try:
+        tmp = "{}.{}.tmp".format(sidecar, os.getpid())
+        with open(tmp, 'w') as fp:
+            json.dump({'key': key, 'digest': digest}, fp)
+        os.replace(tmp, sidecar)
+    except OSError:
+        # read-only checkpoint directory, hash again at the next start
+        pass
+    return digest
+
+
+def cache_paths(path):
+    """Return the (blob, index) cache file paths of the checkpoint `path`."""
+    prefix = "{}.{}.v{}".format(path, cached_digest(path)[:16], _VERSION)
+    return prefix + ".npy", prefix + ".json"
+
+
+def save_state_dict(state_dict, blob_path, index_path):
+    arrays, index, size = [], [], 0
+    for name, tensor in state_dict.items():
+        # np.ascontiguousarray would turn 0-d tensors such as BatchNorm's
+        # num_batches_tracked into 1-d arrays
+        array = tensor.detach().cpu().contiguous().numpy()
+        index.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': size})
+        arrays.append(array)
+        size += -(-array.nbytes // _ALIGN) * _ALIGN
+
+    blob = np.zeros(size, dtype=np.uint8)
+    for array, entry in zip(arrays, index):
+        blob[entry['offset']:entry['offset'] + array.nbytes] = array.reshape(-1).view(np.uint8)
+
+    # the index is written last and both files are renamed into place, so
+    # a partially written cache is never picked up
+    tmp = "{}.{}.tmp".format(blob_path, os.getpid())
+    with open(tmp, 'wb') as fp:
+        np.save(fp, blob)
+    os.replace(tmp, blob_path)
+    tmp = "{}.{}.tmp".format(index_path, os.getpid())
+    with open(tmp, 'w') as fp:
+        json.dump(index, fp)
+    os.replace(tmp, index_path)
+
+
+def load_state_dict(blob_path, index_path):
+    with open(index_path, 'r') as fp:
+        index = json.load(fp)
+    # copy-on-write, so the views are writable without touching the file
+    blob = np.load(blob_path, mmap_mode='c')
+    state_dict = {}
+    for entry in index:
+        dtype = np.dtype(entry['dtype'])
+        nbytes = int(np.prod(entry['shape'])) * dtype.itemsize
+        array = blob[entry['offset']:entry['offset'] + nbytes].view(dtype).reshape(entry['shape'])
+        state_dict[entry['name']] = torch.from_numpy(array)
+    return state_dict
+
+
+def load_state_dict_cached(path, key=None):
+    """
+    Load a state dict from the checkpoint `path` through the cache.
+
+    Args:
+        path (str): Checkpoint written by `torch.save`
+        key (str): Entry of the checkpoint dict holding the state dict, None
+            if the checkpoint is the state dict itself
+
+    Returns:
+        dict: Parameter name to CPU tensor
+    """
+    blob_path, index_path = cache_paths(path)
+    if os.path.exists(index_path) and os.path.exists(blob_path):
+        return load_state_dict(blob_path, index_path)
+
+    state_dict = torch.load(path, map_location=lambda storage, loc: storage)
+    if key is not None:
+        state_dict = state_dict[key]
+    try:
+        save_state_dict(state_dict, blob_path, index_path)
+    except OSError as e:
+        # read-only checkpoint directory, keep working without the cache
+        print("Could not write weight cache for {}: {}".format(path, e))
+    return state_dict
@@ -39,11 +39,27 @@ class DeepSort(object):
         # update tracker
         self.tracker.predict()
         self.tracker.update(detections)
+        return self._outputs()
 
+    def warmup(self, batch_size=8, iterations=3):
+        """Warm up the ReID extractor, see `Extractor.warmup`."""
+        return self.extractor.warmup(batch_size, iterations)
+
+    def predict(self, ori_img):
+        """
+        Advance the tracks by one frame without detections, e.g. on frames the
+        detector skipped. Coasted frames do not count as misses at the next
+        `update`. Returns the predicted boxes like `update`.
+        """
+        self.height, self.width = ori_img.shape[:2]
+        self.tracker.predict()
+        return self._outputs()
+
+    def _outputs(self):
         # output bbox identities
         outputs = []
         for track in self.tracker.tracks:
-            if not track.is_confirmed() or track.time_since_update > 1:
+            if not track.is_confirmed() or track.time_since_update > 1 + self.tracker.frames_since_update:
                 continue
             box = track.to_tlwh()
             x1,y1,x2,y2 = self._tlwh_to_xyxy(box)
@@ -23,24 +23,45 @@ def iou(bbox, candidates):
         occluded by the candidate.
 
     """
-    bbox_tl, bbox_br = bbox[:2], bbox[:2] + bbox[2:]
-    candidates_tl = candidates[:, :2]
-    candidates_br = candidates[:, :2] + candidates[:, 2:]
-
-    tl = np.c_[np.maximum(bbox_tl[0], candidates_tl[:, 0])[:, np.newaxis],
-               np.maximum(bbox_tl[1], candidates_tl[:, 1])[:, np.newaxis]]
-    br = np.c_[np.minimum(bbox_br[0], candidates_br[:, 0])[:, np.newaxis],
-               np.minimum(bbox_br[1], candidates_br[:, 1])[:, np.newaxis]]
+    return iou_matrix(bbox[np.newaxis, :], candidates)[0]
+
+
+def iou_matrix(bboxes, candidates):
+    """Compute the intersection over union between every pair of boxes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format
+        `(top left x, top left y, width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of candidate bounding boxes in the same format.
+
+    Returns
+    -------
+    ndarray
+        An NxM matrix whose entry (i, j) is the intersection over union
+        between `bboxes[i]` and `candidates[j]`.
+
+    """
+    bboxes_tl = bboxes[:, np.newaxis, :2]
+    bboxes_br = bboxes_tl + bboxes[:, np.newaxis, 2:]
+    candidates_tl = candidates[np.newaxis, :, :2]
+    candidates_br = candidates_tl + candidates[np.newaxis, :, 2:]
+
+    tl = np.maximum(bboxes_tl, candidates_tl)
+    br = np.minimum(bboxes_br, candidates_br)
     wh = np.maximum(0., br - tl)
 
-    area_intersection = wh.prod(axis=1)
-    area_bbox = bbox[2:].prod()
-    area_candidates = candidates[:, 2:].prod(axis=1)
-    return area_intersection / (area_bbox + area_candidates - area_intersection)
+    area_intersection = wh[..., 0] * wh[..., 1]
+    area_bboxes = bboxes[:, 2:].prod(axis=1)[:, np.newaxis]
+    area_candidates = candidates[:, 2:].prod(axis=1)[np.newaxis, :]
+    return area_intersection / (
+        area_bboxes + area_candidates - area_intersection)
 
 
 def iou_cost(tracks, detections, track_indices=None,
-             detection_indices=None):
+             detection_indices=None, max_time_since_update=1):
     """An intersection over union distance metric.
 
     Parameters
@@ -55,6 +76,9 @@ def iou_cost(tracks, detections, track_indices=None,
     detection_indices : Optional[List[int]]
         A list of indices to detections that should be matched. Defaults
         to all `detections`.
+    max_time_since_update : Optional[int]
+        Tracks whose `time_since_update` is larger are not matched. Defaults
+        to 1, the tracks updated in the last frame.
 
     Returns
     -------
@@ -69,13 +93,17 @@ def iou_cost(tracks, detections, track_indices=None,
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
+    cost_matrix = np.full(
+        (len(track_indices), len(detection_indices)),
+        linear_assignment.INFTY_COST)
+    time_since_update = np.array(
+        [tracks[i].time_since_update for i in track_indices], dtype=int)
+    stale = time_since_update > max_time_since_update
+    if stale.all() or len(detection_indices) == 0:
+        return cost_matrix
 
-        bbox = tracks[track_idx].to_tlwh()
-        candidates = np.asarray([detections[i].tlwh for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
+    bboxes = np.asarray([tracks[i].to_tlwh()
+                         for i in np.asarray(track_indices)[~stale]])
+    candidates = np.asarray([detections[i].tlwh for i in detection_indices])
+    cost_matrix[~stale] = 1. - iou_matrix(bboxes, candidates)
     return cost_matrix
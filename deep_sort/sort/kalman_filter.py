@@ -227,3 +227,154 @@ class KalmanFilter(object):
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
+
+    def _stds(self, heights, weight_position, weight_velocity,
+              aspect_position, aspect_velocity):
+        """Nx8 standard deviations relative to the box heights, like the
+        lists built by the single-track methods."""
+        stds = np.empty((len(heights), 8))
+        stds[:, [0, 1, 3]] = weight_position * heights[:, None]
+        stds[:, 2] = aspect_position
+        stds[:, [4, 5, 7]] = weight_velocity * heights[:, None]
+        stds[:, 6] = aspect_velocity
+        return stds
+
+    @staticmethod
+    def _diag(variances):
+        """Stack the rows of an NxD matrix into N diagonal DxD matrices."""
+        n, ndim = variances.shape
+        diag = np.zeros((n, ndim, ndim))
+        diag[:, np.arange(ndim), np.arange(ndim)] = variances
+        return diag
+
+    def predict_batch(self, mean, covariance):
+        """Run Kalman filter prediction step on N states at once.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the object states at the
+            previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the object states at
+            the previous time step.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx8 mean vectors and Nx8x8 covariance matrices of the
+            predicted states, as `predict` would for every state.
+
+        """
+        stds = self._stds(mean[:, 3], self._std_weight_position,
+                          self._std_weight_velocity, 1e-2, 1e-5)
+        motion_cov = self._diag(np.square(stds))
+
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(np.matmul(
+            self._motion_mat, covariance), self._motion_mat.T) + motion_cov
+        return mean, covariance
+
+    def project_batch(self, mean, covariance):
+        """Project N state distributions to measurement space.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 covariance matrices, as
+            `project` would for every state.
+
+        """
+        stds = self._stds(mean[:, 3], self._std_weight_position, 0., 1e-1, 0.)
+        innovation_cov = self._diag(np.square(stds[:, :4]))
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(np.matmul(
+            self._update_mat, covariance), self._update_mat.T)
+        return mean, covariance + innovation_cov
+
+    def update_batch(self, mean, covariance, measurement):
+        """Run Kalman filter correction step on N states at once.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional predicted mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices.
+        measurement : ndarray
+            The Nx4 dimensional measurements (x, y, a, h), the i-th one
+            associated with the i-th state.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions, as `update`
+            would for every state.
+
+        """
+        projected_mean, projected_cov = self.project_batch(mean, covariance)
+
+        # K^T = S^-1 (H P)^T, solved through the batched Cholesky factors of S
+        chol_factor = np.linalg.cholesky(projected_cov)
+        cov_h = np.matmul(covariance, self._update_mat.T)
+        kalman_gain = np.linalg.solve(
+            np.swapaxes(chol_factor, 1, 2),
+            np.linalg.solve(chol_factor, np.swapaxes(cov_h, 1, 2)))
+        kalman_gain = np.swapaxes(kalman_gain, 1, 2)
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.einsum('nij,nj->ni', kalman_gain, innovation)
+        new_covariance = covariance - np.matmul(np.matmul(
+            kalman_gain, projected_cov), np.swapaxes(kalman_gain, 1, 2))
+        return new_mean, new_covariance
+
+    def gating_distance_batch(self, mean, covariance, measurements,
+                              only_position=False):
+        """Compute gating distances between N state distributions and M
+        measurements.
+
+        Parameters
+        ----------
+        mean : ndarray
+            Nx8 dimensional mean vectors of the state distributions.
+        covariance : ndarray
+            Nx8x8 dimensional covariances of the state distributions.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements (x, y, a, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix whose i-th row is what `gating_distance`
+            returns for the i-th state distribution.
+
+        """
+        mean, covariance = self.project_batch(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        # Whiten with the inverse Cholesky factors of the N small innovation
+        # covariances, stacked so that the measurements of all N
+        # distributions are whitened by a single matrix product.
+        n, ndim = mean.shape
+        cholesky_factor = np.linalg.cholesky(covariance)
+        inverse_factor = np.linalg.solve(
+            cholesky_factor, np.broadcast_to(np.eye(ndim), covariance.shape))
+        whitening = np.swapaxes(inverse_factor, 1, 2)
+        z = np.dot(measurements, whitening.transpose(1, 0, 2).reshape(
+            ndim, n * ndim)).reshape(len(measurements), n, ndim)
+        z -= np.einsum('ni,nij->nj', mean, whitening)
+        squared_maha = np.einsum('mni,mni->nm', z, z)
+        return squared_maha
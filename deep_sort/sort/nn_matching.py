@@ -101,6 +101,12 @@ class NearestNeighborDistanceMetric(object):
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
 
+    The samples live in a preallocated gallery array of shape
+    (targets, budget, dimensionality). Each target owns one row used as a
+    ring buffer, so adding a sample overwrites the oldest one in place, and
+    the distances to all targets come from one matrix product followed by a
+    masked minimum over the samples of each row.
+
     Parameters
     ----------
     metric : str
@@ -114,25 +120,79 @@ class NearestNeighborDistanceMetric(object):
 
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to the samples that
+        have been observed so far, oldest first, normalized to unit length
+        for the "cosine" metric. Built from the gallery on access.
 
     """
 
     def __init__(self, metric, matching_threshold, budget=None):
 
 
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        self.metric = metric
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+
+        self._rows = {}  # target identity -> gallery row
+        self._free_rows = []
+        self._gallery = None  # (targets, budget, dimensionality)
+        self._norms = None  # squared norms of the samples, for "euclidean"
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._heads = np.zeros(0, dtype=np.int64)
+
+    @property
+    def samples(self):
+        samples = {}
+        for target, row in self._rows.items():
+            count, head = self._counts[row], self._heads[row]
+            gallery = self._gallery[row]
+            if count < len(gallery):
+                samples[target] = gallery[:count].copy()
+            else:
+                samples[target] = np.concatenate(
+                    (gallery[head:], gallery[:head]))
+        return samples
+
+    def _allocate(self, num_rows, num_samples, dim, dtype):
+        """Grow the gallery to `num_rows` rows of `num_samples`
+        samples, keeping the samples of the existing rows in place."""
+        if self._gallery is None:
+            old_rows, old_samples = 0, 0
+        else:
+            old_rows, old_samples = self._gallery.shape[:2]
+            dtype = self._gallery.dtype
+        gallery = np.zeros((num_rows, num_samples, dim), dtype=dtype)
+        norms = np.zeros((num_rows, num_samples), dtype=dtype)
+        if self._gallery is not None:
+            gallery[:old_rows, :old_samples] = self._gallery
+            norms[:old_rows, :old_samples] = self._norms
+        self._gallery, self._norms = gallery, norms
+        self._counts = np.r_[
+            self._counts, np.zeros(num_rows - old_rows, dtype=np.int64)]
+        self._heads = np.r_[
+            self._heads, np.zeros(num_rows - old_rows, dtype=np.int64)]
+        self._free_rows.extend(range(num_rows - 1, old_rows - 1, -1))
+
+    def _row(self, target, feature):
+        row = self._rows.get(target)
+        if row is not None:
+            return row
+        if not self._free_rows:
+            if self._gallery is None:
+                self._allocate(
+                    16, self.budget or 16, len(feature), feature.dtype)
+            else:
+                self._allocate(
+                    2 * len(self._gallery), self._gallery.shape[1],
+                    self._gallery.shape[2], None)
+        row = self._free_rows.pop()
+        self._counts[row], self._heads[row] = 0, 0
+        self._rows[target] = row
+        return row
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -147,11 +207,31 @@ class NearestNeighborDistanceMetric(object):
             A list of targets that are currently present in the scene.
 
         """
+        features = np.asarray(features)
+        if self.metric == "cosine" and len(features):
+            features = features / np.linalg.norm(
+                features, axis=1, keepdims=True)
         for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]
-        self.samples = {k: self.samples[k] for k in active_targets}
+            row = self._row(target, feature)
+            num_samples = self._gallery.shape[1]
+            if self.budget is None:
+                # Without budget the rows only grow, oldest sample first.
+                if self._counts[row] == num_samples:
+                    self._allocate(
+                        len(self._gallery), 2 * num_samples,
+                        self._gallery.shape[2], None)
+                    num_samples *= 2
+                head = self._counts[row]
+            else:
+                head = self._heads[row]
+            self._gallery[row, head] = feature
+            self._norms[row, head] = np.dot(feature, feature)
+            self._heads[row] = (head + 1) % num_samples
+            self._counts[row] = min(self._counts[row] + 1, num_samples)
+
+        active_targets = set(active_targets)
+        for target in [k for k in self._rows if k not in active_targets]:
+            self._free_rows.append(self._rows.pop(target))
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -171,7 +251,28 @@ class NearestNeighborDistanceMetric(object):
             `targets[i]` and `features[j]`.
 
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
+        rows = np.array([self._rows[target] for target in targets],
+                        dtype=np.int64)
+        if len(rows) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+
+        features = np.asarray(features)
+        if self.metric == "cosine":
+            features = features / np.linalg.norm(
+                features, axis=1, keepdims=True)
+        gallery = self._gallery[rows]
+        num_samples, dim = gallery.shape[1:]
+        products = np.dot(gallery.reshape(-1, dim), features.T).reshape(
+            len(rows), num_samples, len(features))
+        if self.metric == "cosine":
+            distances = 1. - products
+        else:
+            distances = np.clip(
+                -2. * products + self._norms[rows][:, :, None] +
+                np.square(features).sum(axis=1)[None, None, :],
+                0., float(np.inf))
+
+        # Slots beyond the sample count of a row hold no sample.
+        empty = np.arange(num_samples)[None, :] >= self._counts[rows][:, None]
+        distances[empty] = np.inf
+        return distances.min(axis=1)
@@ -1,4 +1,5 @@
 # vim: expandtab:ts=4:sw=4
+import numpy as np
 
 
 class TrackState:
@@ -16,12 +17,145 @@ class TrackState:
     Deleted = 3
 
 
+def _column(name):
+    def fget(self):
+        return self._columns[name][:self._size]
+
+    def fset(self, value):
+        self._columns[name][:self._size] = value
+    return property(fget, fset)
+
+
+class TrackTable(object):
+    """
+    Columnar store of the tracks of a `Tracker`.
+
+    Every track is one row of contiguous arrays, so a time step can select
+    tracks with boolean masks and update all of them with array operations.
+    Deleting tracks compacts the rows in place. Each row is also exposed as
+    a `Track` view for code that handles one track at a time.
+
+    Parameters
+    ----------
+    capacity : Optional[int]
+        Number of rows allocated up front. The arrays double in size when
+        they are full.
+
+    Attributes
+    ----------
+    mean : ndarray
+        The Nx8 dimensional mean vectors of the N tracks.
+    covariance : ndarray
+        The Nx8x8 dimensional covariance matrices.
+    track_id, hits, age, time_since_update, state, n_init, max_age : ndarray
+        Length N arrays of the `Track` attributes of the same name.
+    features : List[List[ndarray]]
+        The feature cache of every track.
+
+    """
+
+    mean = _column('mean')
+    covariance = _column('covariance')
+    track_id = _column('track_id')
+    hits = _column('hits')
+    age = _column('age')
+    time_since_update = _column('time_since_update')
+    state = _column('state')
+    n_init = _column('n_init')
+    max_age = _column('max_age')
+
+    def __init__(self, capacity=32):
+        self._size = 0
+        self._columns = {
+            'mean': np.zeros((capacity, 8)),
+            'covariance': np.zeros((capacity, 8, 8)),
+        }
+        for name in ('track_id', 'hits', 'age', 'time_since_update', 'state',
+                     'n_init', 'max_age'):
+            self._columns[name] = np.zeros(capacity, dtype=np.int64)
+        self.features = []
+        self._views = []
+
+    def __len__(self):
+        return self._size
+
+    def views(self):
+        """Returns the list of `Track` views, in row order."""
+        return list(self._views)
+
+    def add(self, mean, covariance, track_id, n_init, max_age, feature=None):
+        """Append a new tentative track, see `Track`.
+
+        Returns
+        -------
+        Track
+            The view on the new row.
+
+        """
+        track = Track.__new__(Track)
+        self._insert(track, mean, covariance, track_id, n_init, max_age,
+                     feature)
+        return track
+
+    def compact(self, keep):
+        """Remove the rows where the boolean mask `keep` is False.
+
+        The remaining rows are moved up in place, in order. Views on removed
+        rows are detached: they keep their last values in a table of their
+        own.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        index = np.flatnonzero(keep)
+        for row in np.flatnonzero(~keep):
+            self._views[row]._detach()
+        for column in self._columns.values():
+            column[:len(index)] = column[index]
+        self.features = [self.features[row] for row in index]
+        self._views = [self._views[row] for row in index]
+        for row, track in enumerate(self._views):
+            track._index = row
+        self._size = len(index)
+
+    def _insert(self, track, mean, covariance, track_id, n_init, max_age,
+                feature=None):
+        if self._size == len(self._columns['mean']):
+            for name, column in self._columns.items():
+                grown = np.zeros((2 * len(column),) + column.shape[1:],
+                                 dtype=column.dtype)
+                grown[:len(column)] = column
+                self._columns[name] = grown
+        row = self._size
+        self._size += 1
+        values = dict(mean=mean, covariance=covariance, track_id=track_id,
+                      hits=1, age=1, time_since_update=0,
+                      state=TrackState.Tentative, n_init=n_init,
+                      max_age=max_age)
+        for name, value in values.items():
+            self._columns[name][row] = value
+        self.features.append([] if feature is None else [feature])
+        self._views.append(track)
+        track._table, track._index = self, row
+
+
+def _field(name):
+    def fget(self):
+        value = self._table._columns[name][self._index]
+        return value if value.ndim else value.item()
+
+    def fset(self, value):
+        self._table._columns[name][self._index] = value
+    return property(fget, fset)
+
+
 class Track:
     """
     A single target track with state space `(x, y, a, h)` and associated
     velocities, where `(x, y)` is the center of the bounding box, `a` is the
     aspect ratio and `h` is the height.
 
+    A track is a view on one row of a `TrackTable`; a track created on its
+    own gets a table of its own.
+
     Parameters
     ----------
     mean : ndarray
@@ -63,22 +197,40 @@ class Track:
 
     """
 
+    mean = _field('mean')
+    covariance = _field('covariance')
+    track_id = _field('track_id')
+    hits = _field('hits')
+    age = _field('age')
+    time_since_update = _field('time_since_update')
+    state = _field('state')
+    _n_init = _field('n_init')
+    _max_age = _field('max_age')
+
     def __init__(self, mean, covariance, track_id, n_init, max_age,
                  feature=None):
-        self.mean = mean
-        self.covariance = covariance
-        self.track_id = track_id
-        self.hits = 1
-        self.age = 1
-        self.time_since_update = 0
+        TrackTable(capacity=1)._insert(
+            self, mean, covariance, track_id, n_init, max_age, feature)
 
-        self.state = TrackState.Tentative
-        self.features = []
-        if feature is not None:
-            self.features.append(feature)
+    @property
+    def features(self):
+        return self._table.features[self._index]
+
+    @features.setter
+    def features(self, features):
+        self._table.features[self._index] = features
 
-        self._n_init = n_init
-        self._max_age = max_age
+    def _detach(self):
+        # move this row to a table of its own, its own table is left as is
+        table, index = self._table, self._index
+        TrackTable(capacity=1)._insert(
+            self, table._columns['mean'][index],
+            table._columns['covariance'][index],
+            table._columns['track_id'][index], table._columns['n_init'][index],
+            table._columns['max_age'][index])
+        for name in ('hits', 'age', 'time_since_update', 'state'):
+            self._table._columns[name][0] = table._columns[name][index]
+        self._table.features[0] = table.features[index]
 
     def to_tlwh(self):
         """Get current position in bounding box format `(top left x, top left y,
@@ -137,6 +289,12 @@ class Track:
         """
         self.mean, self.covariance = kf.update(
             self.mean, self.covariance, detection.to_xyah())
+        self.mark_hit(detection)
+
+    def mark_hit(self, detection):
+        """Mark this track as associated with `detection` at the current time
+        step, once its state distribution has been corrected.
+        """
         self.features.append(detection.feature)
 
         self.hits += 1
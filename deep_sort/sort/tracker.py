@@ -1,10 +1,11 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
+import functools
 import numpy as np
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
-from .track import Track
+from .track import TrackState, TrackTable
 
 
 class Tracker:
@@ -32,8 +33,15 @@ class Tracker:
         Number of frames that a track remains in initialization phase.
     kf : kalman_filter.KalmanFilter
         A Kalman filter to filter target trajectories in image space.
+    table : track.TrackTable
+        The columnar store of the active tracks at the current time step.
     tracks : List[Track]
-        The list of active tracks at the current time step.
+        The list of active tracks at the current time step, as views on the
+        rows of `table`.
+    frames_since_update : int
+        Number of `predict` calls since the last `update`. More than one
+        before an `update` means the tracks coasted through frames without
+        detections, which do not count as misses.
 
     """
 
@@ -44,16 +52,28 @@ class Tracker:
         self.n_init = n_init
 
         self.kf = kalman_filter.KalmanFilter()
-        self.tracks = []
+        self.table = TrackTable()
+        self.frames_since_update = 0
         self._next_id = 1
 
+    @property
+    def tracks(self):
+        return self.table.views()
+
     def predict(self):
         """Propagate track state distributions one time step forward.
 
         This function should be called once every time step, before `update`.
+        It may be called alone on time steps without detections.
         """
-        for track in self.tracks:
-            track.predict(self.kf)
+        self.frames_since_update += 1
+        table = self.table
+        if not len(table):
+            return
+        table.mean, table.covariance = self.kf.predict_batch(
+            table.mean, table.covariance)
+        table.age += 1
+        table.time_since_update += 1
 
     def update(self, detections):
         """Perform measurement update and track management.
@@ -69,32 +89,48 @@ class Tracker:
             self._match(detections)
 
         # Update track set.
-        for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(
-                self.kf, detections[detection_idx])
-        for track_idx in unmatched_tracks:
-            self.tracks[track_idx].mark_missed()
+        table = self.table
+        matched = np.zeros(len(table), dtype=bool)
+        if matches:
+            track_idx = np.array([i for i, _ in matches])
+            table.mean[track_idx], table.covariance[track_idx] = \
+                self.kf.update_batch(
+                    table.mean[track_idx], table.covariance[track_idx],
+                    np.asarray([detections[j].to_xyah() for _, j in matches]))
+            for i, j in matches:
+                table.features[i].append(detections[j].feature)
+            matched[track_idx] = True
+            table.hits[matched] += 1
+            table.time_since_update[matched] = 0
+            table.state[matched & (table.state == TrackState.Tentative) &
+                        (table.hits >= table.n_init)] = TrackState.Confirmed
+
+        missed = np.zeros(len(table), dtype=bool)
+        missed[list(unmatched_tracks)] = True
+        table.state[missed & ((table.state == TrackState.Tentative) |
+                              (table.time_since_update > table.max_age))] = \
+            TrackState.Deleted
         for detection_idx in unmatched_detections:
             self._initiate_track(detections[detection_idx])
-        self.tracks = [t for t in self.tracks if not t.is_deleted()]
+        table.compact(table.state != TrackState.Deleted)
 
         # Update distance metric.
-        active_targets = [t.track_id for t in self.tracks if t.is_confirmed()]
+        confirmed = np.flatnonzero(table.state == TrackState.Confirmed)
+        active_targets = table.track_id[confirmed].tolist()
         features, targets = [], []
-        for track in self.tracks:
-            if not track.is_confirmed():
-                continue
-            features += track.features
-            targets += [track.track_id for _ in track.features]
-            track.features = []
+        for i in confirmed:
+            features += table.features[i]
+            targets += [table.track_id[i]] * len(table.features[i])
+            table.features[i] = []
         self.metric.partial_fit(
             np.asarray(features), np.asarray(targets), active_targets)
+        self.frames_since_update = 0
 
     def _match(self, detections):
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
             features = np.array([dets[i].feature for i in detection_indices])
-            targets = np.array([tracks[i].track_id for i in track_indices])
+            targets = self.table.track_id[track_indices]
             cost_matrix = self.metric.distance(features, targets)
             cost_matrix = linear_assignment.gate_cost_matrix(
                 self.kf, cost_matrix, tracks, dets, track_indices,
@@ -103,28 +139,35 @@ class Tracker:
             return cost_matrix
 
         # Split track set into confirmed and unconfirmed tracks.
-        confirmed_tracks = [
-            i for i, t in enumerate(self.tracks) if t.is_confirmed()]
-        unconfirmed_tracks = [
-            i for i, t in enumerate(self.tracks) if not t.is_confirmed()]
+        tracks = self.tracks
+        confirmed = self.table.state == TrackState.Confirmed
+        confirmed_tracks = np.flatnonzero(confirmed).tolist()
+        unconfirmed_tracks = np.flatnonzero(~confirmed).tolist()
 
         # Associate confirmed tracks using appearance features.
         matches_a, unmatched_tracks_a, unmatched_detections = \
             linear_assignment.matching_cascade(
                 gated_metric, self.metric.matching_threshold, self.max_age,
-                self.tracks, detections, confirmed_tracks)
+                tracks, detections, confirmed_tracks)
 
         # Associate remaining tracks together with unconfirmed tracks using IOU.
+        # Tracks updated at the last update have coasted since then, if
+        # `predict` was called alone in between.
+        last_update = max(self.frames_since_update, 1)
+        time_since_update = self.table.time_since_update
         iou_track_candidates = unconfirmed_tracks + [
-            k for k in unmatched_tracks_a if
-            self.tracks[k].time_since_update == 1]
+            k for k in unmatched_tracks_a
+            if time_since_update[k] == last_update]
         unmatched_tracks_a = [
-            k for k in unmatched_tracks_a if
-            self.tracks[k].time_since_update != 1]
+            k for k in unmatched_tracks_a
+            if time_since_update[k] != last_update]
         matches_b, unmatched_tracks_b, unmatched_detections = \
             linear_assignment.min_cost_matching(
-                iou_matching.iou_cost, self.max_iou_distance, self.tracks,
-                detections, iou_track_candidates, unmatched_detections)
+                functools.partial(
+                    iou_matching.iou_cost,
+                    max_time_since_update=last_update),
+                self.max_iou_distance, tracks, detections,
+                iou_track_candidates, unmatched_detections)
 
         matches = matches_a + matches_b
         unmatched_tracks = list(set(unmatched_tracks_a + unmatched_tracks_b))
@@ -132,7 +175,7 @@ class Tracker:
 
     def _initiate_track(self, detection):
         mean, covariance = self.kf.initiate(detection.to_xyah())
-        self.tracks.append(Track(
+        self.table.add(
             mean, covariance, self._next_id, self.n_init, self.max_age,
-            detection.feature))
+            detection.feature)
         self._next_id += 1
@@ -33,6 +33,16 @@ def parse_cfg(cfgfile):
     fp.close()
     return blocks
 
+def save_cfg(blocks, cfgfile):
+    """Write parsed cfg `blocks` back to a darknet cfg file."""
+    with open(cfgfile, 'w') as fp:
+        for block in blocks:
+            fp.write('[%s]\n' % block['type'])
+            for key, value in block.items():
+                if key != 'type':
+                    fp.write('%s=%s\n' % ('type' if key == '_type' else key, value))
+            fp.write('\n')
+
 def print_cfg(blocks):
     print('layer     filters    size              input                output');
     prev_width = 416
@@ -22,11 +22,12 @@ class Upsample(nn.Module):
         self.stride = stride
     def forward(self, x):
         stride = self.stride
-        assert(x.data.dim() == 4)
-        B = x.data.size(0)
-        C = x.data.size(1)
-        H = x.data.size(2)
-        W = x.data.size(3)
+        assert(x.dim() == 4)
+        # sizes of x itself, not x.data, so torch.jit.trace keeps the batch dynamic
+        B = x.size(0)
+        C = x.size(1)
+        H = x.size(2)
+        W = x.size(3)
         ws = stride
         hs = stride
         x = x.view(B, C, H, 1, W, 1).expand(B, C, H, hs, W, ws).contiguous().view(B, C, H*hs, W*ws)
@@ -74,6 +75,24 @@ class EmptyModule(nn.Module):
     def forward(self, x):
         return x
 
+def fuse_conv_bn(conv, bn):
+    """Return a convolution computing bn(conv(x)) with the BatchNorm folded
+    into its weights and bias."""
+    fused = nn.Conv2d(conv.in_channels, conv.out_channels, conv.kernel_size, conv.stride,
+                      conv.padding, conv.dilation, conv.groups, bias=True).to(conv.weight.device)
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+    with torch.no_grad():
+        fused.weight.copy_(conv.weight * scale.view(-1, 1, 1, 1))
+        fused.bias.copy_((bias - bn.running_mean) * scale + bn.bias)
+    return fused
+
+# operations of the compiled forward plan
+OP_MODULE = 0
+OP_ROUTE = 1
+OP_SHORTCUT = 2
+OP_DETECTION = 3
+
 # support route shortcut and reorg
 
 class Darknet(nn.Module):
@@ -89,6 +108,7 @@ class Darknet(nn.Module):
         self.use_cuda = use_cuda
         self.blocks = parse_cfg(cfgfile)
         self.models = self.create_network(self.blocks) # merge conv, bn,leaky
+        self.plan = self.compile_plan(self.blocks)
         self.loss_layers = self.getLossLayers()
 
         #self.width = int(self.blocks[0]['width'])
@@ -104,53 +124,115 @@ class Darknet(nn.Module):
         # default format : major=0, minor=1
         self.header = torch.IntTensor([0,1,0,0])
         self.seen = 0
+        self.fused = False
 
     def forward(self, x):
-        ind = -2
         self.loss_layers = None
         outputs = dict()
         out_boxes = dict()
         outno = 0
-        for block in self.blocks:
+        for ind, op, args, keep, release in self.plan:
+            if op == OP_MODULE:
+                x = self.models[ind](x)
+            elif op == OP_ROUTE:
+                if len(args) == 1:
+                    x = outputs[args[0]]
+                else:
+                    x = torch.cat([outputs[i] for i in args], 1)
+            elif op == OP_SHORTCUT:
+                from_layer, activation = args
+                x = outputs[from_layer] + x
+                if activation == 'leaky':
+                    x = F.leaky_relu(x, 0.1, inplace=True)
+                elif activation == 'relu':
+                    x = F.relu(x, inplace=True)
+            elif op == OP_DETECTION:
+                boxes = self.models[ind].get_mask_boxes(x)
+                out_boxes[outno]= boxes
+                outno += 1
+            if keep:
+                outputs[ind] = x
+            # free activations as soon as their last consumer has run
+            for i in release:
+                del outputs[i]
+        return x if outno == 0 else out_boxes
+
+    def compile_plan(self, blocks):
+        """Turn the parsed cfg into a list of (ind, op, args, keep, release)
+        steps, with route/shortcut sources resolved to absolute layer indices.
+
+        Only outputs that a later route or shortcut reads are kept (`keep`),
+        and each is released right after its last reader (`release`).
+        """
+        steps = []
+        last_use = dict()
+        ind = -2
+        for block in blocks:
             ind = ind + 1
 
             if block['type'] == 'net':
                 continue
             elif block['type'] in ['convolutional', 'maxpool', 'reorg', 'upsample', 'avgpool', 'softmax', 'connected']:
-                x = self.models[ind](x)
-                outputs[ind] = x
+                steps.append((ind, OP_MODULE, None))
             elif block['type'] == 'route':
                 layers = block['layers'].split(',')
                 layers = [int(i) if int(i) > 0 else int(i)+ind for i in layers]
-                if len(layers) == 1:
-                    x = outputs[layers[0]]
-                elif len(layers) == 2:
-                    x1 = outputs[layers[0]]
-                    x2 = outputs[layers[1]]
-                    x = torch.cat((x1,x2),1)
-                outputs[ind] = x
+                for i in layers:
+                    last_use[i] = ind
+                steps.append((ind, OP_ROUTE, tuple(layers)))
             elif block['type'] == 'shortcut':
                 from_layer = int(block['from'])
-                activation = block['activation']
                 from_layer = from_layer if from_layer > 0 else from_layer + ind
-                x1 = outputs[from_layer]
-                x2 = outputs[ind-1]
-                x  = x1 + x2
-                if activation == 'leaky':
-                    x = F.leaky_relu(x, 0.1, inplace=True)
-                elif activation == 'relu':
-                    x = F.relu(x, inplace=True)
-                outputs[ind] = x
+                last_use[from_layer] = ind
+                steps.append((ind, OP_SHORTCUT, (from_layer, block['activation'])))
             elif block['type'] in [ 'region', 'yolo']:
-                boxes = self.models[ind].get_mask_boxes(x)
-                out_boxes[outno]= boxes
-                outno += 1
-                outputs[ind] = None
+                steps.append((ind, OP_DETECTION, None))
             elif block['type'] == 'cost':
                 continue
             else:
                 print('unknown type %s' % (block['type']))
-        return x if outno == 0 else out_boxes
+
+        plan = []
+        for ind, op, args in steps:
+            release = tuple(i for i, last in sorted(last_use.items()) if last == ind)
+            plan.append((ind, op, args, ind in last_use, release))
+        return plan
+
+    def fuse(self):
+        """Fold every BatchNorm into its convolution for inference.
+
+        Call after `load_weights`, on a model in eval mode. A fused network can
+        no longer load or save darknet weights.
+        """
+        ind = -2
+        for block in self.blocks:
+            ind = ind + 1
+            if block['type'] != 'convolutional' or not int(block['batch_normalize']):
+                continue
+            model = self.models[ind]
+            children = list(model.named_children())
+            fused = nn.Sequential()
+            fused.add_module(children[0][0], fuse_conv_bn(model[0], model[1]))
+            for name, module in children[2:]:
+                fused.add_module(name, module)
+            self.models[ind] = fused
+        self.fused = True
+        return self
+
+    def set_input_size(self, width, height):
+        """Run the network at another input size, a multiple of the stride 32.
+
+        The network is fully convolutional and the detection heads decode
+        boxes relative to their own grid, so the same weights serve any size;
+        only the sizes the heads see in training are updated.
+        """
+        if width % 32 or height % 32:
+            raise ValueError("input size must be a multiple of 32, got %dx%d" % (width, height))
+        self.width, self.height = width, height
+        for layer in self.getLossLayers():
+            if isinstance(layer, YoloLayer):
+                layer.net_width, layer.net_height = width, height
+        return self
 
     def print_network(self):
         print_cfg(self.blocks)
@@ -300,6 +382,7 @@ class Darknet(nn.Module):
                 yolo_layer.anchor_mask = [int(i) for i in anchor_mask]
                 yolo_layer.anchors = [float(i) for i in anchors]
                 yolo_layer.num_classes = int(block['classes'])
+                yolo_layer.class_activation = block.get('class_activation', 'softmax')
                 yolo_layer.num_anchors = int(block['num'])
                 yolo_layer.anchor_step = len(yolo_layer.anchors)//yolo_layer.num_anchors
                 try:
@@ -331,11 +414,15 @@ class Darknet(nn.Module):
             seen = np.fromfile(fp, count=1, dtype=np.int32)
         self.header = torch.from_numpy(np.concatenate((version, seen), axis=0))
         self.seen = int(seen)
-        body = np.fromfile(fp, dtype=np.float32)
+        offset = fp.tell()
         fp.close()
+        # the body already is a flat float32 array: map it copy-on-write instead
+        # of reading it, pages are then copied straight into the modules
+        body = np.memmap(weightfile, dtype=np.float32, mode='c', offset=offset)
         return body
 
     def load_weights(self, weightfile):
+        assert not self.fused, "load weights before fusing the network"
         buf = self.load_binfile(weightfile)
 
         start = 0
@@ -383,6 +470,7 @@ class Darknet(nn.Module):
                 print('unknown type %s' % (block['type']))
 
     def save_weights(self, outfile, cutoff=0):
+        assert not self.fused, "a fused network can not be saved as darknet weights"
         if cutoff <= 0:
             cutoff = len(self.blocks)-1
 
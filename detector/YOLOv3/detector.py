@@ -1,5 +1,5 @@
 import torch
-# import time
+import time
 import numpy as np
 import cv2
 import os
@@ -8,53 +8,219 @@ project_name = "deep_sort_pytorch"
 sys.path.append("/content/drive/My Drive/Code/deep_sort_pytorch/detector/YOLOv3")
 
 
-from darknet import Darknet
-from yolo_utils import get_all_boxes, nms, post_process, xywh_to_xyxy, xyxy_to_xywh
+from yolo_utils import nms, post_process, xywh_to_xyxy, xyxy_to_xywh
 from nms import boxes_nms
+from runtime import build_runtime
+from tiling import merge_tile_boxes, tile_grid
 
 
 class YOLOv3(object):
-    def __init__(self, cfgfile, weightfile, namesfile, score_thresh=0.7, conf_thresh=0.01, nms_thresh=0.45, is_xywh=False, use_cuda=True):
-        # net definition
-        self.net = Darknet(cfgfile)
-        self.net.load_weights(weightfile)
-        print('Loading weights from %s... Done!' % (weightfile))
+    def __init__(self, cfgfile, weightfile, namesfile, score_thresh=0.7, conf_thresh=0.01, nms_thresh=0.45, is_xywh=False, use_cuda=True,
+                 classes=None, pre_nms_topk=-1, fuse=False, backend='eager', model_path=None,
+                 tile_size=0, tile_overlap=0.2, max_tiles=-1, input_sizes=None, obj_thresh=0.3):
+        # net definition, run by the eager, torchscript or onnxruntime backend
         self.device = "cuda" if use_cuda else "cpu"
-        self.net.eval()
-        self.net.to(self.device)
+        # cells below the objectness threshold of post_process are dropped before decoding
+        self.runtime = build_runtime(backend, cfgfile, weightfile, model_path, self.device,
+                                     fuse=fuse, conf_thresh=max(conf_thresh, obj_thresh))
+        self.net = getattr(self.runtime, 'net', None) # only the eager backend has a Darknet
+        self.fuse = fuse
+        self.memory_format = self.runtime.memory_format
 
         # constants
-        self.size = self.net.width, self.net.height
+        self.size = self.runtime.width, self.runtime.height
         self.score_thresh = score_thresh
         self.conf_thresh = conf_thresh
+        self.obj_thresh = obj_thresh
         self.nms_thresh = nms_thresh
+        self.classes = classes # class ids to keep, None keeps all
+        self.pre_nms_topk = pre_nms_topk
         self.use_cuda = use_cuda
         self.is_xywh = is_xywh
-        self.num_classes = self.net.num_classes
+        self.num_classes = self.runtime.num_classes
         self.class_names = self.load_class_names(namesfile)
+        # tiled detection of small objects, disabled when tile_size is 0
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.max_tiles = max_tiles
+        # input sizes the network may be switched to, the cfg one included
+        self.input_sizes = self._input_sizes(input_sizes)
 
-    def __call__(self, ori_img):
+        # reusable input buffers per input size, grown on demand to the largest batch seen
+        self._buffers = {}
+
+    def __call__(self, ori_img, size=None):
+        if self.tile_size > 0:
+            return self.detect_tiled(ori_img, size)
+        return self.detect_batch([ori_img], size)[0]
+
+    def warmup(self, frame_shape=None, iterations=3):
+        """Run synthetic frames through the detector before the first real one.
+
+        The first forward passes allocate buffers and pick kernels, so they
+        are several times slower than the following ones. Every input size
+        is run once, starting with the default size, then `iterations`
+        frames at the default size.
+
+        Args:
+            frame_shape (tuple): (height, width) of the frames to come, the
+                network input size by default
+
+        Returns:
+            tuple: Seconds taken by the first call, and on average by the last ones
+        """
+        height, width = frame_shape or self.size[::-1]
+        frame = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        timings = []
+        sizes = [self.size] + [size for size in self.input_sizes if size != self.size]
+        for size in sizes + [self.size] * iterations:
+            start = time.time()
+            self(frame, size)
+            timings.append(time.time() - start)
+        return timings[0], float(np.mean(timings[-iterations:]))
+
+    def set_input_size(self, size):
+        """Switch the default network input size to one of `input_sizes`.
+
+        Args:
+            size (int or tuple): Side of a square input, or (width, height)
+        """
+        size = self._check_size(size)
+        if self.net is not None:
+            self.net.set_input_size(*size)
+        self.size = size
+
+    def _input_sizes(self, input_sizes):
+        sizes = set([self.size])
+        for size in input_sizes or ():
+            size = (size, size) if np.isscalar(size) else tuple(size)
+            if size[0] % 32 or size[1] % 32:
+                raise ValueError("input size must be a multiple of 32, got %dx%d" % size)
+            if size != self.size and not self.runtime.dynamic_size:
+                raise ValueError("the runtime only runs at its exported input size %dx%d" % self.size)
+            sizes.add(size)
+        return sorted(sizes)
+
+    def _check_size(self, size):
+        if size is None:
+            return self.size
+        size = (size, size) if np.isscalar(size) else tuple(size)
+        if size not in self.input_sizes:
+            raise ValueError("Invalid input size %dx%d; must be one of %s" %
+                             (size + (", ".join("%dx%d" % s for s in self.input_sizes),)))
+        return size
+
+    def detect_batch(self, ori_imgs, size=None):
+        """Detect objects in several frames with a single forward pass.
+
+        The frames may come from different cameras or be consecutive frames of
+        one video, and may have different sizes. They are resized to the
+        network input `size`, one of `input_sizes`, by default `self.size`.
+
+        Returns a list with one (bbox, cls_conf, cls_ids) tuple per frame, each
+        being (None, None, None) if nothing was detected in that frame.
+        """
         # img to tensor
-        assert isinstance(ori_img, np.ndarray), "input must be a numpy array!"
-        img = ori_img.astype(np.float)/255.
+        assert len(ori_imgs) > 0, "input must contain at least one image!"
+        img = self.preprocess(ori_imgs, self._check_size(size))
 
-        img = cv2.resize(img, self.size)
-        img = torch.from_numpy(img).float().permute(2,0,1).unsqueeze(0)
-        
         # forward
-        with torch.no_grad():
-            img = img.to(self.device)
-            out_boxes = self.net(img)
-            boxes = get_all_boxes(out_boxes, self.conf_thresh, self.num_classes, use_cuda=self.use_cuda) #batch size is 1
+        with self._grad_mode():
+            boxes = self.runtime(img)
             # boxes = nms(boxes, self.nms_thresh)
 
-            boxes = post_process(boxes, self.net.num_classes, self.conf_thresh, self.nms_thresh)[0].cpu()
-            boxes = boxes[boxes[:,-2]>self.score_thresh, :] # bbox xmin ymin xmax ymax
+            batch_boxes = post_process(boxes, self.num_classes, self.conf_thresh, self.nms_thresh,
+                                       obj_thresh=self.obj_thresh, classes=self.classes,
+                                       pre_nms_topk=self.pre_nms_topk, batch_size=len(ori_imgs))
+
+        return [self._to_detections(boxes.cpu(), ori_img.shape[:2])
+                for boxes, ori_img in zip(batch_boxes, ori_imgs)]
+
+    def detect_tiled(self, ori_img, size=None):
+        """Detect small objects in a high resolution frame.
+
+        The frame is split into overlapping `tile_size` tiles which all go
+        through a single forward pass. Their boxes are mapped back to the frame
+        and duplicates along the tile seams are merged by the NMS of
+        `post_process`.
+
+        Returns a (bbox, cls_conf, cls_ids) tuple like `__call__`.
+        """
+        height, width = ori_img.shape[:2]
+        tiles = tile_grid(width, height, self.tile_size, self.tile_overlap, self.max_tiles)
+        return self.detect_regions(ori_img, tiles, self._check_size(size))
+
+    def detect_regions(self, ori_img, regions, size=None):
+        """Detect objects inside several regions of one frame with a single forward pass.
+
+        `regions` are (x, y, w, h) pixel rectangles, each resized to the network
+        input `size` (width, height), by default `self.size`. Only runtimes with
+        `dynamic_size` accept another size, others keep `self.size`. Boxes cut
+        by a region border inside the frame are dropped, the rest is mapped back
+        to the frame and merged across overlapping regions by NMS.
+
+        Returns a (bbox, cls_conf, cls_ids) tuple like `__call__`.
+        """
+        assert len(regions) > 0, "input must contain at least one region!"
+        height, width = ori_img.shape[:2]
+        if not self.runtime.dynamic_size:
+            size = None
+        img = self.preprocess([ori_img[y:y+h, x:x+w] for x, y, w, h in regions], size)
+
+        with self._grad_mode():
+            boxes = merge_tile_boxes(self.runtime(img), regions, width, height)
+            pre_nms_topk = self.pre_nms_topk * len(regions) if self.pre_nms_topk > 0 else -1
+            batch_boxes = post_process(boxes, self.num_classes, self.conf_thresh, self.nms_thresh,
+                                       obj_thresh=self.obj_thresh, classes=self.classes,
+                                       pre_nms_topk=pre_nms_topk, batch_size=1)
+
+        return self._to_detections(batch_boxes[0].cpu(), (height, width))
+
+    def preprocess(self, ori_imgs, size=None):
+        """Resize uint8 frames and convert them to a normalized NCHW float32 batch.
+
+        Frames are resized while still uint8 into a preallocated buffer, then
+        scaled to [0, 1] and transposed to NCHW by a single op writing straight
+        into a reusable (pinned, when running on cuda) float32 tensor, so no
+        full-resolution float copy of a frame is ever made.
+
+        The returned tensor is only valid until the next call.
+        """
+        batch = len(ori_imgs)
+        size = tuple(size or self.size)
+        width, height = size
+        resized, tensor = self._buffers.get(size, (None, None))
+        if resized is None or len(resized) < batch:
+            resized = np.empty((batch, height, width, 3), dtype=np.uint8)
+            if self.memory_format == torch.channels_last:
+                # NHWC storage viewed as NCHW is exactly the channels_last layout
+                tensor = torch.empty((batch, height, width, 3), dtype=torch.float32,
+                                     pin_memory=self.device == "cuda").permute(0,3,1,2)
+            else:
+                tensor = torch.empty((batch, 3, height, width), dtype=torch.float32,
+                                     pin_memory=self.device == "cuda")
+            self._buffers[size] = resized, tensor
+
+        for ori_img, dst in zip(ori_imgs, resized):
+            assert isinstance(ori_img, np.ndarray), "input must be a numpy array!"
+            cv2.resize(ori_img, size, dst=dst)
+
+        img = tensor[:batch]
+        torch.mul(torch.from_numpy(resized[:batch]).permute(0,3,1,2), 1/255., out=img)
+        return img.to(self.device, non_blocking=True)
+
+    def _grad_mode(self):
+        if self.fuse and hasattr(torch, 'inference_mode'):
+            return torch.inference_mode()
+        return torch.no_grad()
+
+    def _to_detections(self, boxes, img_shape):
+        boxes = boxes[boxes[:,-2]>self.score_thresh, :] # bbox xmin ymin xmax ymax
 
         if len(boxes)==0:
             return None,None,None
         
-        height , width = ori_img.shape[:2]
+        height , width = img_shape
         bbox = boxes[:,:4]
         if self.is_xywh:
             # bbox x y w h
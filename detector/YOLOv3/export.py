@@ -0,0 +1,107 @@
+"""
+Export a Darknet YOLOv3 to TorchScript or ONNX.
+
+The exported graph contains the network and the YOLO head decoding of
+`get_all_boxes`. It maps a (batch, 3, height, width) float image batch in
+[0, 1] to (batch, num_boxes, 7) boxes laid out as
+[x1, y1, x2, y2, det_conf, cls_conf, cls_id]. NMS is not part of the graph,
+so every runtime shares `post_process`.
+
+    python detector/YOLOv3/export.py detector/YOLOv3/cfg/yolo_v3.cfg \\
+        detector/YOLOv3/weight/yolov3.weights --format onnx
+"""
+import argparse
+import inspect
+import os
+
+import torch
+import torch.nn as nn
+
+from darknet import Darknet
+from yolo_utils import get_all_boxes
+
+FORMATS = ('torchscript', 'onnx')
+
+
+class DarknetDetect(nn.Module):
+    """Darknet followed by the decoding of all of its YOLO heads."""
+
+    def __init__(self, net, conf_thresh=0.01):
+        super(DarknetDetect, self).__init__()
+        self.net = net
+        self.conf_thresh = conf_thresh
+
+    def forward(self, x):
+        output = self.net(x)
+        return get_all_boxes(output, self.conf_thresh, self.net.num_classes, use_cuda=x.is_cuda)
+
+
+def load_darknet(cfgfile, weightfile, fuse=True):
+    net = Darknet(cfgfile)
+    net.load_weights(weightfile)
+    net.eval()
+    if fuse:
+        net.fuse()
+    return net
+
+
+def export_torchscript(net, outfile, batch_size=1, device="cpu"):
+    # a traced model runs on the device type it was traced on
+    model = DarknetDetect(net).eval().to(device)
+    dummy = torch.rand(batch_size, 3, net.height, net.width, device=device)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, dummy, check_trace=False)
+    traced = torch.jit.freeze(traced)
+    traced.save(outfile)
+    return outfile
+
+
+def export_onnx(net, outfile, batch_size=1, opset_version=11):
+    model = DarknetDetect(net).eval().cpu()
+    dummy = torch.rand(batch_size, 3, net.height, net.width)
+    kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # newer torch defaults to the dynamo exporter, keep the tracing one
+        kwargs['dynamo'] = False
+    with torch.no_grad():
+        torch.onnx.export(model, dummy, outfile, opset_version=opset_version,
+                          input_names=['images'], output_names=['boxes'],
+                          dynamic_axes={'images': {0: 'batch'}, 'boxes': {0: 'batch'}}, **kwargs)
+    return outfile
+
+
+def export(cfgfile, weightfile, fmt, outfile=None, fuse=True, device="cpu"):
+    """
+    Export a Darknet to `fmt`, one of `FORMATS`.
+
+    Returns:
+        str: Path of the exported model, next to the weights unless `outfile` is given
+    """
+    if fmt not in FORMATS:
+        raise ValueError("Invalid format %r; must be one of %s" % (fmt, ", ".join(FORMATS)))
+    if outfile is None:
+        outfile = os.path.splitext(weightfile)[0] + ('.pt' if fmt == 'torchscript' else '.onnx')
+    net = load_darknet(cfgfile, weightfile, fuse=fuse)
+    if fmt == 'torchscript':
+        return export_torchscript(net, outfile, device=device)
+    return export_onnx(net, outfile)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cfgfile", type=str)
+    parser.add_argument("weightfile", type=str)
+    parser.add_argument("--format", type=str, default='onnx', choices=FORMATS)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--no_fuse", dest="fuse", action="store_false",
+                        help="keep BatchNorm layers separate from the convolutions")
+    parser.add_argument("--use_cuda", action="store_true",
+                        help="trace the TorchScript model for cuda instead of cpu")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    outfile = export(args.cfgfile, args.weightfile, args.format, args.output, fuse=args.fuse,
+                     device="cuda" if args.use_cuda else "cpu")
+    print("Exported %s model to %s" % (args.format, outfile))
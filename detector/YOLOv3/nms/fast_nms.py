@@ -0,0 +1,103 @@
+import torch
+import numpy as np
+
+try:
+    import numba
+
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+def _numpy_keep(boxes, scores, nms_thresh):
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = boxes[:, 2]
+    y2 = boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(scores)[::-1]
+
+    keep = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        while order.size > 0:
+            i = order[0]
+            keep.append(i)
+            rest = order[1:]
+
+            w = np.maximum(0., np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+            h = np.maximum(0., np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+            inter = w * h
+            ovr = inter / (areas[i] + areas[rest] - inter)
+            # a nan overlap (degenerate boxes) never suppresses, like python_nms
+            order = rest[~(ovr >= nms_thresh)]
+    return np.array(keep, dtype=np.int64)
+
+
+if HAS_NUMBA:
+    @numba.njit(cache=True, nogil=True, error_model='numpy')
+    def _numba_keep(boxes, order, nms_thresh):
+        x1 = boxes[:, 0]
+        y1 = boxes[:, 1]
+        x2 = boxes[:, 2]
+        y2 = boxes[:, 3]
+        areas = (x2 - x1) * (y2 - y1)
+        num_detections = order.shape[0]
+        suppressed = np.zeros(num_detections, dtype=np.bool_)
+        keep = np.empty(num_detections, dtype=np.int64)
+        num_keep = 0
+        for _i in range(num_detections):
+            i = order[_i]
+            if suppressed[i]:
+                continue
+            keep[num_keep] = i
+            num_keep += 1
+            for _j in range(_i + 1, num_detections):
+                j = order[_j]
+                if suppressed[j]:
+                    continue
+                w = max(0., min(x2[i], x2[j]) - max(x1[i], x1[j]))
+                h = max(0., min(y2[i], y2[j]) - max(y1[i], y1[j]))
+                inter = w * h
+                ovr = inter / (areas[i] + areas[j] - inter)
+                if ovr >= nms_thresh:
+                    suppressed[j] = True
+        return keep[:num_keep]
+
+
+def _run_on_cpu(keep_fn, boxes, scores, nms_thresh):
+    if boxes.numel() == 0:
+        return torch.empty((0,), dtype=torch.long, device=boxes.device)
+    origin_device = boxes.device
+    cpu_device = torch.device('cpu')
+    boxes = np.ascontiguousarray(boxes.to(cpu_device).numpy())
+    scores = scores.to(cpu_device).numpy()
+    keep = keep_fn(boxes, scores, nms_thresh)
+    return torch.from_numpy(keep).to(origin_device)
+
+
+def numpy_nms(boxes, scores, nms_thresh):
+    """ Performs non-maximum suppression with numpy, suppressing the boxes that
+    overlap the current best box in one vectorized step.
+        Args:
+            boxes(Tensor): `xyxy` mode boxes, shape is (n, 4)
+            scores(Tensor): scores, shape is (n, )
+            nms_thresh(float): thresh
+        Returns:
+            indices kept, sorted by decreasing score.
+    """
+    return _run_on_cpu(_numpy_keep, boxes, scores, nms_thresh)
+
+
+def numba_nms(boxes, scores, nms_thresh):
+    """ Performs non-maximum suppression with a numba compiled loop.
+        Args:
+            boxes(Tensor): `xyxy` mode boxes, shape is (n, 4)
+            scores(Tensor): scores, shape is (n, )
+            nms_thresh(float): thresh
+        Returns:
+            indices kept, sorted by decreasing score.
+    """
+    if not HAS_NUMBA:
+        raise ImportError('numba is not installed')
+    keep_fn = lambda b, s, t: _numba_keep(b, np.argsort(s)[::-1].copy(), t)
+    return _run_on_cpu(keep_fn, boxes, scores, nms_thresh)
@@ -1,20 +1,44 @@
+import os
 import warnings
-import torchvision
+from collections import OrderedDict
+
+from .fast_nms import HAS_NUMBA, numba_nms, numpy_nms
+from .python_nms import python_nms
+
+# available nms implementations, in order of preference
+BACKENDS = OrderedDict()
 
 try:
-    import torch
     import torch_extension
 
-    _nms = torch_extension.nms
+    BACKENDS['torch_extension'] = torch_extension.nms
 except ImportError:
-    if torchvision.__version__ >= '0.3.0':
-        _nms = torchvision.ops.nms
-    else:
-        from .python_nms import python_nms
-
-        _nms = python_nms
-        warnings.warn('You are using python version NMS, which is very very slow. Try compile c++ NMS '
-                      'using `cd ext & python build.py build_ext develop`')
+    pass
+
+try:
+    from torchvision.ops import nms as torchvision_nms
+
+    BACKENDS['torchvision'] = torchvision_nms
+except ImportError:
+    pass
+
+if HAS_NUMBA:
+    BACKENDS['numba'] = numba_nms
+BACKENDS['numpy'] = numpy_nms
+BACKENDS['python'] = python_nms
+
+# set NMS_BACKEND before the first import to force a backend
+BACKEND = os.environ.get('NMS_BACKEND') or next(iter(BACKENDS))
+if BACKEND not in BACKENDS:
+    raise ValueError('Invalid NMS_BACKEND %r; must be one of %s' % (BACKEND, ', '.join(BACKENDS)))
+_nms = BACKENDS[BACKEND]
+
+if BACKEND == 'python':
+    warnings.warn('You are using python version NMS, which is very very slow. Try compile c++ NMS '
+                  'using `cd ext & python build.py build_ext develop`')
+elif BACKEND in ('numba', 'numpy') and 'NMS_BACKEND' not in os.environ:
+    warnings.warn('Neither the c++ NMS extension nor torchvision is available, falling back to %s NMS. '
+                  'Try compile c++ NMS using `cd ext & python build.py build_ext develop`' % BACKEND)
 
 
 def boxes_nms(boxes, scores, nms_thresh, max_count=-1):
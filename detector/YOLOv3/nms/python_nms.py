@@ -27,7 +27,7 @@ def python_nms(boxes, scores, nms_thresh):
     areas = (x2 - x1) * (y2 - y1)
     order = np.argsort(scores)[::-1]
     num_detections = boxes.shape[0]
-    suppressed = np.zeros((num_detections,), dtype=np.bool)
+    suppressed = np.zeros((num_detections,), dtype=bool)
     for _i in range(num_detections):
         i = order[_i]
         if suppressed[i]:
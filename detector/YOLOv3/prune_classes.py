@@ -0,0 +1,130 @@
+"""
+Prune the YOLO heads of a Darknet down to a subset of its classes.
+
+The convolution in front of every [yolo] block predicts, for each of its
+anchors, 4 box coordinates, an objectness and one score per class, i.e.
+3 x (5 + 80) = 255 channels for COCO. Keeping only the channels of the
+classes of interest shrinks these convolutions and the head decoding; for
+person only they drop to 3 x 6 = 18 channels, 14 times fewer.
+
+The pruned heads decode their classes with darknet's independent logistic
+scores (`class_activation=logistic`) instead of a softmax, so the score of
+a kept class does not depend on the pruned ones. The class ids are
+renumbered in the order of `--classes`, keep person (0) first for the
+tracker.
+
+Detection scores therefore move from the softmax over all classes to the
+logistic scale, usually higher for the same box: with the same
+`SCORE_THRESH` the pruned weights keep more boxes than the unpruned ones
+filtered to the same classes. Re-tune `SCORE_THRESH` in the detector config
+used with pruned weights.
+
+    python detector/YOLOv3/prune_classes.py detector/YOLOv3/cfg/yolo_v3.cfg \\
+        detector/YOLOv3/weight/yolov3.weights detector/YOLOv3/cfg/coco.names \\
+        --classes 0 --output detector/YOLOv3/weight/yolov3-person
+"""
+import argparse
+import os
+
+import torch
+import torch.nn as nn
+
+from cfg import save_cfg
+from darknet import Darknet
+
+
+def head_channels(num_anchors, num_classes, class_ids):
+    """Indices of the output channels of a head that predict `class_ids`."""
+    channels = []
+    for anchor in range(num_anchors):
+        first = anchor * (5 + num_classes)
+        channels.extend(range(first, first + 5))
+        channels.extend(first + 5 + i for i in class_ids)
+    return channels
+
+
+def prune_classes(net, class_ids):
+    """
+    Slice the head convolutions of a loaded, unfused Darknet in place.
+
+    Args:
+        net (Darknet): Network with its weights loaded
+        class_ids (list): Class ids to keep, in their new order
+
+    Returns:
+        Darknet: `net`, with its cfg blocks updated to match
+    """
+    assert not net.fused, "prune the network before fusing it"
+    if len(set(class_ids)) != len(class_ids) or not all(0 <= i < net.num_classes for i in class_ids):
+        raise ValueError("class ids must be distinct and below %d, got %s" % (net.num_classes, class_ids))
+
+    ind = -2
+    for block in net.blocks:
+        ind = ind + 1
+        if block['type'] != 'yolo':
+            continue
+        # the linear convolution right before the head
+        conv_block, conv = net.blocks[ind], net.models[ind - 1][0]
+        assert conv_block['type'] == 'convolutional' and not int(conv_block['batch_normalize']), \
+            "a [yolo] block must follow a convolution without batch normalization"
+        layer = net.models[ind]
+        channels = head_channels(len(layer.anchor_mask), layer.num_classes, class_ids)
+
+        pruned = nn.Conv2d(conv.in_channels, len(channels), conv.kernel_size, conv.stride,
+                           conv.padding, bias=True)
+        with torch.no_grad():
+            pruned.weight.copy_(conv.weight[channels])
+            pruned.bias.copy_(conv.bias[channels])
+        net.models[ind - 1][0] = pruned
+
+        conv_block['filters'] = str(len(channels))
+        block['classes'] = str(len(class_ids))
+        block['class_activation'] = 'logistic'
+        layer.num_classes = len(class_ids)
+        layer.class_activation = 'logistic'
+    net.num_classes = len(class_ids)
+    return net
+
+
+def prune(cfgfile, weightfile, namesfile, class_ids, output):
+    """
+    Write `<output>.cfg`, `<output>.weights` and `<output>.names` keeping
+    only `class_ids`.
+
+    Returns:
+        tuple: Paths of the written cfg, weights and names files
+    """
+    net = Darknet(cfgfile)
+    net.load_weights(weightfile)
+    prune_classes(net, class_ids)
+
+    with open(namesfile, 'r', encoding='utf8') as fp:
+        names = [line.strip() for line in fp.readlines()]
+    outfiles = output + '.cfg', output + '.weights', output + '.names'
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    save_cfg(net.blocks, outfiles[0])
+    net.save_weights(outfiles[1])
+    with open(outfiles[2], 'w', encoding='utf8') as fp:
+        fp.write('\n'.join(names[i] for i in class_ids) + '\n')
+    return outfiles
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cfgfile", type=str)
+    parser.add_argument("weightfile", type=str)
+    parser.add_argument("namesfile", type=str)
+    parser.add_argument("--classes", type=int, nargs='+', default=[0],
+                        help="class ids to keep, person only by default")
+    parser.add_argument("--output", type=str, default=None,
+                        help="path prefix of the pruned files, next to the weights by default")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    output = args.output or os.path.splitext(args.weightfile)[0] + '-' + '-'.join(map(str, args.classes))
+    for outfile in prune(args.cfgfile, args.weightfile, args.namesfile, args.classes, output):
+        print("Wrote %s" % outfile)
+    print("Scores of the pruned weights are logistic, re-tune SCORE_THRESH for them")
@@ -0,0 +1,282 @@
+"""
+INT8 post-training quantization of a Darknet YOLOv3 with ONNX Runtime.
+
+The float network is exported with `export.py` and quantized either
+statically, with activation ranges calibrated on a directory of
+representative frames, or dynamically. The INT8 model is an ONNX file that
+`build_detector` loads with BACKEND: "onnxruntime" and BACKEND_MODEL
+pointing at it. Only the convolutions are quantized; the YOLO head decoding
+stays in float.
+
+Both models are then run over held-out clips and the mAP@0.5 and recall of
+each are reported. A clip is a video file or a directory of frames. A clip
+in MOTChallenge layout (`img1/` and `gt/gt.txt`) is scored against its
+ground truth; any other clip is scored against the float model detections,
+so the INT8 numbers then directly measure the agreement with the float
+model.
+
+    python detector/YOLOv3/quantize.py detector/YOLOv3/cfg/yolov3-tiny.cfg \\
+        detector/YOLOv3/weight/yolov3-tiny.weights --calib_dir frames/ \\
+        --eval_clips clip1.mp4 clip2/
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from export import export_onnx, load_darknet
+from detector import YOLOv3
+
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                      QuantType, quantize_dynamic, quantize_static)
+
+MODES = ('static', 'dynamic')
+CALIBRATE_METHODS = {
+    'minmax': CalibrationMethod.MinMax,
+    'entropy': CalibrationMethod.Entropy,
+    'percentile': CalibrationMethod.Percentile,
+}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def frame_paths(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def read_clip(path):
+    """Yield the (frame_id, BGR frame) of a video file or frame directory, frame ids are 1-based."""
+    if os.path.isdir(path):
+        if os.path.isdir(os.path.join(path, 'img1')):
+            path = os.path.join(path, 'img1')
+        for frame_id, frame_path in enumerate(frame_paths(path), 1):
+            yield frame_id, cv2.imread(frame_path)
+        return
+    capture = cv2.VideoCapture(path)
+    frame_id = 0
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frame_id += 1
+        yield frame_id, frame
+    capture.release()
+
+
+def load_mot_gt(clip):
+    """Return {frame_id: (N, 4) xyxy boxes} of a MOTChallenge clip, None if it has no ground truth."""
+    gt_file = os.path.join(clip, 'gt', 'gt.txt') if os.path.isdir(clip) else None
+    if gt_file is None or not os.path.isfile(gt_file):
+        return None
+    rows = np.loadtxt(gt_file, delimiter=',', ndmin=2)
+    if rows.shape[1] > 6:
+        rows = rows[rows[:, 6] != 0] # flag 0 marks boxes to ignore
+    gt = {}
+    for frame_id in np.unique(rows[:, 0]).astype(int):
+        boxes = rows[rows[:, 0] == frame_id, 2:6].copy()
+        boxes[:, 2:] += boxes[:, :2]
+        gt[frame_id] = boxes
+    return gt
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Feeds calibration frames, preprocessed exactly like `YOLOv3` does."""
+
+    def __init__(self, detector, paths, input_name='images'):
+        self.detector = detector
+        self.paths = paths
+        self.input_name = input_name
+        self._iter = iter(paths)
+
+    def get_next(self):
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        img = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+        return {self.input_name: self.detector.preprocess([img]).cpu().numpy().copy()}
+
+    def rewind(self):
+        self._iter = iter(self.paths)
+
+
+def quantize(float_model, int8_model, mode='static', calibration_reader=None, calibrate_method='minmax'):
+    """
+    Quantize the convolutions of an exported float model to INT8.
+
+    Args:
+        float_model (str): ONNX model written by `export_onnx`
+        int8_model (str): Output path
+        mode (str): 'static' calibrates activation ranges with
+            `calibration_reader`, 'dynamic' computes them at runtime
+        calibrate_method (str): One of `CALIBRATE_METHODS`
+    """
+    if mode not in MODES:
+        raise ValueError("Invalid mode %r; must be one of %s" % (mode, ", ".join(MODES)))
+    if mode == 'dynamic':
+        # ConvInteger only has uint8 weight kernels on the CPU
+        quantize_dynamic(float_model, int8_model, op_types_to_quantize=['Conv'],
+                         weight_type=QuantType.QUInt8)
+    else:
+        assert calibration_reader is not None, "static quantization needs calibration frames!"
+        quantize_static(float_model, int8_model, calibration_reader,
+                        quant_format=QuantFormat.QDQ, op_types_to_quantize=['Conv'],
+                        per_channel=True, activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8,
+                        calibrate_method=CALIBRATE_METHODS[calibrate_method])
+    return int8_model
+
+
+def box_iou(boxes1, boxes2):
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    area2 = np.prod(boxes2[:, 2:] - boxes2[:, :2], axis=1)
+    return inter / (area1[:, None] + area2[None, :] - inter + 1e-9)
+
+
+class DetectionScore(object):
+    """Accumulates the mAP@`iou_thresh` and recall@`score_thresh` of one model."""
+
+    def __init__(self, iou_thresh=0.5, score_thresh=0.5):
+        self.iou_thresh = iou_thresh
+        self.score_thresh = score_thresh
+        self.scores = []
+        self.matched = []
+        self.num_gt = 0
+        self.time = 0.
+        self.frames = 0
+
+    def add(self, boxes, scores, gt_boxes):
+        """Greedily match the detections of one frame to its ground truth, by descending score."""
+        self.num_gt += len(gt_boxes)
+        if len(boxes) == 0:
+            return
+        order = np.argsort(-scores)
+        boxes, scores = boxes[order], scores[order]
+        matched = np.zeros(len(boxes), dtype=bool)
+        if len(gt_boxes):
+            iou = box_iou(boxes, gt_boxes)
+            taken = np.zeros(len(gt_boxes), dtype=bool)
+            for i in range(len(boxes)):
+                candidates = np.where(~taken & (iou[i] >= self.iou_thresh))[0]
+                if len(candidates):
+                    j = candidates[np.argmax(iou[i, candidates])]
+                    taken[j] = matched[i] = True
+        self.scores.append(scores)
+        self.matched.append(matched)
+
+    def ap(self):
+        if self.num_gt == 0 or not self.scores:
+            return 0.
+        order = np.argsort(-np.concatenate(self.scores), kind='mergesort')
+        tp = np.cumsum(np.concatenate(self.matched)[order])
+        recall = tp / self.num_gt
+        precision = tp / np.arange(1, len(tp) + 1)
+        # all-point interpolated area under the precision/recall curve
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        return float(np.sum(np.diff(np.concatenate([[0.], recall])) * precision))
+
+    def recall(self):
+        if self.num_gt == 0:
+            return 0.
+        scores, matched = np.concatenate(self.scores or [[]]), np.concatenate(self.matched or [[]])
+        return float(np.sum(matched[scores >= self.score_thresh])) / self.num_gt
+
+
+def detect_xyxy(detector, img, score):
+    tic = time.time()
+    bbox, cls_conf, cls_ids = detector(img)
+    score.time += time.time() - tic
+    score.frames += 1
+    if bbox is None:
+        return np.zeros((0, 4)), np.zeros(0)
+    return bbox, cls_conf
+
+
+def evaluate(float_detector, int8_detector, clips, iou_thresh=0.5, score_thresh=0.5, frame_interval=1):
+    """
+    Run both detectors over `clips` and score them.
+
+    Returns:
+        tuple: `DetectionScore` of the float and of the INT8 model
+    """
+    float_score = DetectionScore(iou_thresh, score_thresh)
+    int8_score = DetectionScore(iou_thresh, score_thresh)
+    for clip in clips:
+        gt = load_mot_gt(clip)
+        for frame_id, frame in read_clip(clip):
+            if frame_id % frame_interval:
+                continue
+            img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            float_boxes, float_scores = detect_xyxy(float_detector, img, float_score)
+            int8_boxes, int8_scores = detect_xyxy(int8_detector, img, int8_score)
+            if gt is not None:
+                gt_boxes = gt.get(frame_id, np.zeros((0, 4)))
+            else:
+                gt_boxes = float_boxes[float_scores >= score_thresh]
+            float_score.add(float_boxes, float_scores, gt_boxes)
+            int8_score.add(int8_boxes, int8_scores, gt_boxes)
+    return float_score, int8_score
+
+
+def report(float_score, int8_score):
+    lines = ["{:>8s} {:>9s} {:>8s} {:>10s}".format("model", "mAP@0.5", "recall", "ms/frame")]
+    for name, score in (("float", float_score), ("int8", int8_score)):
+        lines.append("{:>8s} {:9.4f} {:8.4f} {:10.2f}".format(
+            name, score.ap(), score.recall(), 1000. * score.time / max(score.frames, 1)))
+    lines.append("{:>8s} {:9.4f} {:8.4f}".format(
+        "delta", int8_score.ap() - float_score.ap(), int8_score.recall() - float_score.recall()))
+    return "\n".join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cfgfile", type=str)
+    parser.add_argument("weightfile", type=str)
+    parser.add_argument("--namesfile", type=str, default=os.path.join(os.path.dirname(__file__), 'cfg/coco.names'))
+    parser.add_argument("--mode", type=str, default='static', choices=MODES)
+    parser.add_argument("--calib_dir", type=str, default=None, help="directory of representative frames")
+    parser.add_argument("--num_calib", type=int, default=200, help="frames sampled evenly from calib_dir")
+    parser.add_argument("--calibrate_method", type=str, default='minmax', choices=CALIBRATE_METHODS)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--eval_clips", type=str, nargs='*', default=[], help="held-out videos or frame directories")
+    parser.add_argument("--eval_frame_interval", type=int, default=1)
+    parser.add_argument("--classes", type=int, nargs='*', default=[0], help="class ids to evaluate")
+    parser.add_argument("--score_thresh", type=float, default=0.5, help="operating point of the recall")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    prefix = os.path.splitext(args.output or args.weightfile)[0]
+    float_model = prefix + '.float.onnx'
+    int8_model = args.output or prefix + '.int8.onnx'
+
+    # opset 13 for per-channel QDQ quantization
+    export_onnx(load_darknet(args.cfgfile, args.weightfile), float_model, opset_version=13)
+    print("Exported float model to %s" % float_model)
+
+    # keep low scoring boxes, they make up the tail of the precision/recall curve
+    kwargs = dict(score_thresh=0.01, use_cuda=False, classes=args.classes or None, backend='onnxruntime')
+    float_detector = YOLOv3(args.cfgfile, args.weightfile, args.namesfile, model_path=float_model, **kwargs)
+
+    reader = None
+    if args.mode == 'static':
+        assert args.calib_dir is not None, "static quantization needs --calib_dir!"
+        paths = frame_paths(args.calib_dir)
+        if len(paths) > args.num_calib:
+            paths = [paths[i] for i in np.linspace(0, len(paths) - 1, args.num_calib).astype(int)]
+        print("Calibrating on %d frames from %s" % (len(paths), args.calib_dir))
+        reader = FrameCalibrationReader(float_detector, paths, float_detector.runtime.input_name)
+    quantize(float_model, int8_model, args.mode, reader, args.calibrate_method)
+    print("Wrote %s INT8 model to %s" % (args.mode, int8_model))
+
+    if args.eval_clips:
+        int8_detector = YOLOv3(args.cfgfile, args.weightfile, args.namesfile, model_path=int8_model, **kwargs)
+        float_score, int8_score = evaluate(float_detector, int8_detector, args.eval_clips,
+                                           score_thresh=args.score_thresh,
+                                           frame_interval=args.eval_frame_interval)
+        print(report(float_score, int8_score))
@@ -0,0 +1,118 @@
+"""
+Runtime backends executing the YOLOv3 network.
+
+Every runtime maps a preprocessed (batch, 3, height, width) float tensor to
+the decoded boxes of `get_all_boxes`, so `YOLOv3` shares its preprocessing
+and `post_process` across backends and always returns the same detections
+contract. Exported models return the dense (batch, num_boxes, 7) boxes, the
+eager runtime only the compact boxes of the cells passing `conf_thresh`.
+"""
+from collections import OrderedDict
+
+import torch
+
+from cfg import parse_cfg
+from darknet import Darknet
+from yolo_utils import get_all_boxes
+
+try:
+    import onnxruntime
+
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+
+def net_info(cfgfile):
+    """Return (width, height, num_classes) of a darknet cfg without building the network."""
+    blocks = parse_cfg(cfgfile)
+    heads = [block for block in blocks if block['type'] in ('yolo', 'region')]
+    return int(blocks[0]['width']), int(blocks[0]['height']), int(heads[-1]['classes'])
+
+
+class EagerRuntime(object):
+    """The PyTorch `Darknet`, optionally BN-fused and in channels_last layout."""
+
+    def __init__(self, cfgfile, weightfile, model_path, device, fuse=False, conf_thresh=0.01):
+        self.net = Darknet(cfgfile)
+        self.net.load_weights(weightfile)
+        print('Loading weights from %s... Done!' % (weightfile))
+        self.net.eval()
+        # inference build: BN folded into the convs, NHWC activations
+        self.memory_format = torch.channels_last if fuse else torch.contiguous_format
+        if fuse:
+            self.net.fuse()
+        self.net.to(device, memory_format=self.memory_format)
+        self.width, self.height, self.num_classes = self.net.width, self.net.height, self.net.num_classes
+        self.conf_thresh = conf_thresh
+        self.use_cuda = device == "cuda"
+        # fully convolutional, runs at any multiple of 32
+        self.dynamic_size = True
+
+    def __call__(self, img):
+        out_boxes = self.net(img)
+        return get_all_boxes(out_boxes, self.conf_thresh, self.num_classes, use_cuda=self.use_cuda, compact=True)
+
+
+class TorchScriptRuntime(object):
+    """A model written by `export.py --format torchscript` on the same device type."""
+
+    def __init__(self, cfgfile, weightfile, model_path, device, fuse=False, conf_thresh=0.01):
+        self.model = torch.jit.load(model_path, map_location=device)
+        print('Loading TorchScript model from %s... Done!' % (model_path))
+        self.memory_format = torch.contiguous_format
+        self.dynamic_size = False
+        self.width, self.height, self.num_classes = net_info(cfgfile)
+
+    def __call__(self, img):
+        return self.model(img)
+
+
+class OnnxRuntime(object):
+    """A model written by `export.py --format onnx`, run by ONNX Runtime."""
+
+    def __init__(self, cfgfile, weightfile, model_path, device, fuse=False, conf_thresh=0.01):
+        if not HAS_ONNXRUNTIME:
+            raise ImportError("the onnxruntime backend needs the onnxruntime package")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ['CPUExecutionProvider']
+        if device == "cuda":
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=providers)
+        print('Loading ONNX model from %s... Done!' % (model_path))
+        self.input_name = self.session.get_inputs()[0].name
+        self.memory_format = torch.contiguous_format
+        self.dynamic_size = False
+        self.width, self.height, self.num_classes = net_info(cfgfile)
+
+    def __call__(self, img):
+        boxes, = self.session.run(None, {self.input_name: img.cpu().numpy()})
+        return torch.from_numpy(boxes).to(img.device)
+
+
+RUNTIMES = OrderedDict([
+    ('eager', EagerRuntime),
+    ('torchscript', TorchScriptRuntime),
+    ('onnxruntime', OnnxRuntime),
+])
+
+
+def build_runtime(backend, cfgfile, weightfile, model_path, device, fuse=False, conf_thresh=0.01):
+    """
+    Args:
+        backend (str): One of `RUNTIMES`
+        cfgfile (str): Darknet cfg, gives the input size and number of classes
+        weightfile (str): Darknet weights, used by the eager backend
+        model_path (str): Exported model, used by the other backends
+        device (str): "cuda" or "cpu"
+        fuse (bool): Fold BatchNorm into the convolutions (eager backend)
+
+    Raises:
+        ValueError: If the backend is unknown or has no model to load
+    """
+    if backend not in RUNTIMES:
+        raise ValueError("Invalid backend %r; must be one of %s" % (backend, ", ".join(RUNTIMES)))
+    if backend != 'eager' and not model_path:
+        raise ValueError("the %s backend needs an exported model, see detector/YOLOv3/export.py" % backend)
+    return RUNTIMES[backend](cfgfile, weightfile, model_path, device, fuse=fuse, conf_thresh=conf_thresh)
@@ -0,0 +1,79 @@
+"""
+Overlapping tiles for detecting small objects in high resolution frames.
+
+Each tile is resized to the network input on its own, so a 416 px tile of a
+4K frame is seen at close to native resolution instead of being shrunk ~9x
+with the whole frame.
+"""
+import math
+
+import numpy as np
+import torch
+
+from yolo_utils import compact_boxes
+
+
+def _axis_tiles(length, tile, overlap):
+    if tile >= length:
+        return [0], length
+    stride = tile * (1. - overlap)
+    count = int(math.ceil((length - tile) / stride)) + 1
+    # spread the tiles evenly so the last one ends on the frame border
+    return np.linspace(0, length - tile, count).round().astype(int).tolist(), tile
+
+
+def tile_grid(width, height, tile_size, overlap=0.2, max_tiles=-1):
+    """
+    Cover a frame with overlapping square tiles.
+
+    Args:
+        width, height (int): Frame size in pixels
+        tile_size (int): Tile side in frame pixels
+        overlap (float): Minimum overlap of neighbouring tiles, as a fraction of the tile
+        max_tiles (int): If > 0, tiles are enlarged until at most this many cover the frame
+
+    Returns:
+        list: `(x, y, w, h)` of every tile, row by row
+    """
+    assert 0. <= overlap < 1., "tile overlap must be in [0, 1)!"
+    tile = tile_size
+    while True:
+        xs, tile_w = _axis_tiles(width, tile, overlap)
+        ys, tile_h = _axis_tiles(height, tile, overlap)
+        if max_tiles <= 0 or len(xs) * len(ys) <= max_tiles or len(xs) * len(ys) == 1:
+            break
+        tile = int(math.ceil(tile * 1.25))
+    return [(x, y, tile_w, tile_h) for y in ys for x in xs]
+
+
+def merge_tile_boxes(boxes, tiles, width, height):
+    """
+    Map per-tile boxes to the frame and concatenate them into one image.
+
+    Boxes cut by an inner tile border are dropped: an object narrower than the
+    tile overlap is fully visible in the neighbouring tile, whose box then
+    wins instead of the two halves surviving NMS side by side.
+
+    Args:
+        boxes: Dense (num_tiles, N, 7) boxes of `get_all_boxes` or its compact
+            (boxes, tile ids) tuple, normalized to their tile
+        tiles (list): `(x, y, w, h)` of every tile, see `tile_grid`
+        width, height (int): Frame size in pixels
+
+    Returns:
+        tuple: Compact ((M, 7) boxes, (M,) zero batch ids) normalized to the frame
+    """
+    boxes, tile_ids = compact_boxes(boxes)
+    tiles = torch.tensor(tiles, dtype=boxes.dtype, device=boxes.device)[tile_ids]
+    x, y, w, h = tiles.unbind(1)
+    # a border is inner unless it lies on the frame border
+    inner = torch.stack([x > 0, y > 0, x + w < width, y + h < height], dim=1)
+    cut = torch.stack([boxes[:, 0] <= 0., boxes[:, 1] <= 0.,
+                       boxes[:, 2] >= 1., boxes[:, 3] >= 1.], dim=1)
+    keep = ~(cut & inner).any(dim=1)
+
+    frame = torch.tensor([width, height, width, height], dtype=boxes.dtype, device=boxes.device)
+    scale = torch.stack([w, h, w, h], dim=1) / frame
+    offset = torch.stack([x, y, x, y], dim=1) / frame
+    boxes = torch.cat([boxes[:, :4] * scale + offset, boxes[:, 4:]], dim=1)[keep]
+    return boxes, torch.zeros(len(boxes), dtype=torch.long, device=boxes.device)
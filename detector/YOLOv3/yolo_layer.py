@@ -26,16 +26,26 @@ class YoloLayer(nn.Module):
         self.seen = 0
         self.net_width = 0
         self.net_height = 0
+        # 'softmax' over the classes, or darknet's independent 'logistic'
+        # scores which stay the same when classes are pruned
+        self.class_activation = 'softmax'
+
+        self._mask_cache = None
 
     def get_mask_boxes(self, output):
-        masked_anchors = []
-        for m in self.anchor_mask:
-            masked_anchors += self.anchors[m*self.anchor_step:(m+1)*self.anchor_step]
-        masked_anchors = [anchor/self.stride for anchor in masked_anchors]
-
-        masked_anchors = torch.FloatTensor(masked_anchors).to(self.device)
-        num_anchors = torch.IntTensor([len(self.anchor_mask)]).to(self.device)
-        return {'x':output, 'a':masked_anchors, 'n':num_anchors}
+        # anchors are fixed once the network is built, so build the tensors
+        # only once per device instead of on every forward
+        if self._mask_cache is None or self._mask_cache[0] != self.device:
+            masked_anchors = []
+            for m in self.anchor_mask:
+                masked_anchors += self.anchors[m*self.anchor_step:(m+1)*self.anchor_step]
+            masked_anchors = [anchor/self.stride for anchor in masked_anchors]
+
+            masked_anchors = torch.FloatTensor(masked_anchors).to(self.device)
+            num_anchors = torch.IntTensor([len(self.anchor_mask)]).to(self.device)
+            self._mask_cache = (self.device, masked_anchors, num_anchors)
+        _, masked_anchors, num_anchors = self._mask_cache
+        return {'x':output, 'a':masked_anchors, 'n':num_anchors, 'c':self.class_activation}
 
     def build_targets(self, pred_boxes, target, anchors, nA, nH, nW):
         nB = target.size(0)
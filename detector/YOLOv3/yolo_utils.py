@@ -76,25 +76,60 @@ def multi_bbox_ious(boxes1, boxes2, x1y1x2y2=True):
     return carea/uarea
 
 from nms import boxes_nms
-def post_process(boxes, num_classes, conf_thresh=0.01, nms_thresh=0.45, obj_thresh=0.3):
-    batch_size = boxes.size(0)
+def post_process(boxes, num_classes, conf_thresh=0.01, nms_thresh=0.45, obj_thresh=0.3, classes=None, pre_nms_topk=-1,
+                 batch_size=None):
+    """Class-aware NMS over a whole batch of decoded boxes.
+
+    `boxes` are the dense (batch, N, 7) boxes of `get_all_boxes`, or its
+    compact (boxes, batch ids) tuple together with the `batch_size`.
+    Boxes are first filtered by objectness and by the optional `classes`
+    allow-list, at most `pre_nms_topk` of the highest scoring candidates are
+    kept per image (if > 0), and a single NMS call then runs over all images
+    and classes by offsetting every (image, class) group into its own
+    coordinate range.
+
+    Returns one (n, 7) tensor per image, ordered by class and then by
+    descending score.
+    """
+    if batch_size is None:
+        batch_size = boxes.size(0)
+    boxes, batch_ids = compact_boxes(boxes)
+    device = boxes.device
+
+    mask = boxes[:, 4] > obj_thresh
+    if classes is not None:
+        allowed = torch.zeros(num_classes, dtype=torch.bool, device=device)
+        allowed[torch.as_tensor(classes, dtype=torch.long, device=device)] = True
+        mask = mask & allowed[boxes[:, 6].long()]
+    batch_ids = batch_ids[mask]
+    candidates = boxes[mask]
+
+    if pre_nms_topk > 0 and len(candidates) > pre_nms_topk:
+        # rank candidates by score inside their image, keep the best k
+        order = torch.argsort(candidates[:, 5], descending=True)
+        _, by_image = torch.sort(batch_ids[order] * len(order) + torch.arange(len(order), device=device))
+        order = order[by_image]
+        counts = torch.bincount(batch_ids, minlength=batch_size)
+        starts = torch.cumsum(counts, 0) - counts
+        rank = torch.arange(len(order), device=device) - starts[batch_ids[order]]
+        order = order[rank < pre_nms_topk]
+        candidates, batch_ids = candidates[order], batch_ids[order]
 
     # nms
+    groups = batch_ids * num_classes + candidates[:, 6].long()
+    # offsets are applied in double precision so they don't perturb the ious
+    max_coordinate = candidates[:, :4].max().item() + 1 if len(candidates) else 0.
+    offsets = groups.double()[:, None] * max_coordinate
+    keep = boxes_nms(candidates[:, :4].double() + offsets, candidates[:, 5].double(), nms_thresh)
+    # order kept boxes by image, then class, then descending score
+    keep = keep[torch.argsort(candidates[keep, 5], descending=True)]
+    _, by_group = torch.sort(groups[keep] * len(keep) + torch.arange(len(keep), device=device))
+    keep = keep[by_group]
+    nmsed_boxes, batch_ids = candidates[keep], batch_ids[keep]
+
     results_boxes = []
     for batch_id in range(batch_size):
-        processed_boxes = []
-        for cls_id in range(num_classes):
-            mask = (boxes[batch_id, :, -1] == cls_id) * (boxes[batch_id, :, 4] > obj_thresh)
-            masked_boxes = boxes[batch_id, mask]
-
-            keep = boxes_nms(masked_boxes[:,:4], masked_boxes[:,5], nms_thresh)
-
-            nmsed_boxes = masked_boxes[keep, :]
-        
-            processed_boxes.append(nmsed_boxes)
-        processed_boxes = torch.cat(processed_boxes, dim=0)
-    
-    results_boxes.append(processed_boxes)
+        results_boxes.append(nmsed_boxes[batch_ids == batch_id])
 
     return results_boxes
 
@@ -148,21 +183,83 @@ def convert2cpu(gpu_matrix):
 def convert2cpu_long(gpu_matrix):
     return torch.LongTensor(gpu_matrix.size()).copy_(gpu_matrix)
 
-def get_all_boxes(output, conf_thresh, num_classes, only_objectness=1, validation=False, use_cuda=True):
+def get_all_boxes(output, conf_thresh, num_classes, only_objectness=1, validation=False, use_cuda=True, compact=False):
+    """Decode the boxes of all YOLO heads.
+
+    Returns (batch, num_boxes, 7) boxes for every anchor cell, or with
+    `compact` only the cells whose objectness exceeds `conf_thresh`, as a
+    ((M, 7) boxes, (M,) batch ids) tuple, see `get_region_boxes`.
+    """
     # total number of inputs (batch size)
     # first element (x) for first tuple (x, anchor_mask, num_anchor)
-    batchsize = output[0]['x'].data.size(0)
+    batchsize = output[0]['x'].size(0)
 
     all_boxes = []
     for i in range(len(output)):
-        pred, anchors, num_anchors = output[i]['x'].data, output[i]['a'], output[i]['n'].item()
+        # detach() rather than .data, which would hide the network from torch.jit.trace
+        pred, anchors, num_anchors = output[i]['x'].detach(), output[i]['a'], output[i]['n'].item()
         boxes = get_region_boxes(pred, conf_thresh, num_classes, anchors, num_anchors, \
-                only_objectness=only_objectness, validation=validation, use_cuda=use_cuda)
+                only_objectness=only_objectness, validation=validation, use_cuda=use_cuda,
+                class_activation=output[i].get('c', 'softmax'), compact=compact)
         
         all_boxes.append(boxes)
+    if compact:
+        return tuple(torch.cat(parts) for parts in zip(*all_boxes))
     return torch.cat(all_boxes, dim=1)
 
-def get_region_boxes(output, obj_thresh, num_classes, anchors, num_anchors, only_objectness=1, validation=False, use_cuda=True):
+def compact_boxes(boxes):
+    """Return `boxes` as a ((M, 7) boxes, (M,) batch ids) tuple, whether they
+    are dense (batch, N, 7) boxes or already compact."""
+    if isinstance(boxes, tuple):
+        return boxes
+    batch, num_boxes = boxes.shape[:2]
+    batch_ids = torch.arange(batch, device=boxes.device).repeat_interleave(num_boxes)
+    return boxes.reshape(-1, 7), batch_ids
+
+_grid_cache = {}
+_GRID_CACHE_SIZE = 16
+
+def get_grid(h, w, device, dtype=torch.float32):
+    """Return the (1, 1, 2, h, w) cell offset grid and the (1, 1, 2, 1, 1)
+    grid size used to decode a YOLO head, cached per (h, w, device, dtype)."""
+    key = (h, w, str(device), dtype)
+    grid = _grid_cache.get(key)
+    if grid is None:
+        if len(_grid_cache) >= _GRID_CACHE_SIZE:
+            _grid_cache.clear()
+        grid_x = torch.arange(w, dtype=dtype).view(1, w).expand(h, w)
+        grid_y = torch.arange(h, dtype=dtype).view(h, 1).expand(h, w)
+        offsets = torch.stack([grid_x, grid_y]).view(1, 1, 2, h, w).to(device)
+        size = torch.tensor([w, h], dtype=dtype).view(1, 1, 2, 1, 1).to(device)
+        grid = _grid_cache[key] = (offsets, size)
+    return grid
+
+def decode_classes(cls_logits, det_confs, num_classes, class_activation='softmax', dim=-1):
+    """Return the best class score, times objectness, and its id along `dim`."""
+    if class_activation == 'logistic':
+        # the sigmoid is monotonic, take the max over the logits
+        cls_max_confs, cls_max_ids = torch.max(cls_logits, dim, keepdim=True)
+        cls_max_confs = torch.sigmoid(cls_max_confs)
+        cls_max_ids = cls_max_ids.float()
+    elif num_classes == 1:
+        cls_max_confs = torch.ones_like(det_confs)
+        cls_max_ids = torch.zeros_like(det_confs)
+    else:
+        cls_confs = torch.softmax(cls_logits, dim=dim)
+        cls_max_confs, cls_max_ids = torch.max(cls_confs, dim, keepdim=True)
+        cls_max_ids = cls_max_ids.float()
+    return det_confs * cls_max_confs, cls_max_ids
+
+def get_region_boxes(output, obj_thresh, num_classes, anchors, num_anchors, only_objectness=1, validation=False, use_cuda=True,
+                     class_activation='softmax', compact=False):
+    """Decode the boxes of one YOLO head as [x1, y1, x2, y2, det_conf, cls_conf, cls_id].
+
+    By default every anchor cell is decoded into (batch, num_anchors*h*w, 7)
+    boxes, a fixed shape that exports well. With `compact`, objectness is
+    decoded and thresholded by `obj_thresh` first, and the box and class
+    decoding only runs on the surviving cells, returned as a ((M, 7) boxes,
+    (M,) batch ids) tuple in the same order.
+    """
     device = torch.device("cuda" if use_cuda else "cpu")
     anchors = anchors.to(device)
     anchor_step = anchors.size(0)//num_anchors
@@ -172,43 +269,28 @@ def get_region_boxes(output, obj_thresh, num_classes, anchors, num_anchors, only
     assert(output.size(1) == (5+num_classes)*num_anchors)
     h = output.size(2)
     w = output.size(3)
-    cls_anchor_dim = batch*num_anchors*h*w
 
     # all_boxes = []
-    output = output.view(batch*num_anchors, 5+num_classes, h*w).transpose(0,1).contiguous().view(5+num_classes, cls_anchor_dim)
-
-    grid_x = torch.linspace(0, w-1, w).repeat(batch*num_anchors, h, 1).view(cls_anchor_dim).to(device)
-    grid_y = torch.linspace(0, h-1, h).repeat(w,1).t().repeat(batch*num_anchors, 1, 1).view(cls_anchor_dim).to(device)
-    ix = torch.LongTensor(range(0,2)).to(device)
-    anchor_w = anchors.view(num_anchors, anchor_step).index_select(1, ix[0]).repeat(1, batch, h*w).view(cls_anchor_dim)
-    anchor_h = anchors.view(num_anchors, anchor_step).index_select(1, ix[1]).repeat(1, batch, h*w).view(cls_anchor_dim)
-
-    xs, ys = torch.sigmoid(output[0]) + grid_x, torch.sigmoid(output[1]) + grid_y
-    ws, hs = torch.exp(output[2]) * anchor_w.detach(), torch.exp(output[3]) * anchor_h.detach()
-    det_confs = torch.sigmoid(output[4])
-
-    # by ysyun, dim=1 means input is 2D or even dimension else dim=0
-    cls_confs = torch.nn.Softmax(dim=1)(output[5:5+num_classes].transpose(0,1)).detach()
-    cls_max_confs, cls_max_ids = torch.max(cls_confs, 1)
-    cls_max_confs = cls_max_confs.view(-1)
-    cls_max_ids = cls_max_ids.view(-1).float()
-    
-    # sz_hw = h*w
-    # sz_hwa = sz_hw*num_anchors
-    # det_confs = convert2cpu(det_confs)
-    # cls_max_confs = convert2cpu(cls_max_confs)
-    # cls_max_ids = convert2cpu_long(cls_max_ids)
-    # xs, ys = convert2cpu(xs), convert2cpu(ys)
-    # ws, hs = convert2cpu(ws), convert2cpu(hs)
-
-    cls_confs = det_confs * cls_max_confs
-
-    # boxes = [xs/w, ys/h, ws/w, hs/h, det_confs, cls_confs, cls_max_ids]
-    xs, ys, ws, hs = xs/w, ys/h, ws/w, hs/h
-    x1, y1, x2, y2 = torch.clamp_min(xs-ws/2., 0.), torch.clamp_min(ys-hs/2., 0.), torch.clamp_max(xs+ws/2., 1.), torch.clamp_max(ys+hs/2., 1.)
-    boxes = [x1, y1, x2, y2, det_confs, cls_confs, cls_max_ids]
-    boxes = list(map(lambda x: x.view(batch, -1), boxes))
-    boxes = torch.stack(boxes, dim=2)
+    # contiguous() is a no-op unless the network runs in channels_last
+    output = output.contiguous().view(batch, num_anchors, 5+num_classes, h, w)
+    if compact:
+        return get_compact_boxes(output, obj_thresh, num_classes, anchors.view(num_anchors, anchor_step)[:, 0:2],
+                                 class_activation)
+    offsets, size = get_grid(h, w, output.device, output.dtype)
+    anchor_wh = anchors.view(1, num_anchors, anchor_step, 1, 1)[:, :, 0:2]
+
+    # decode every anchor of every cell at once, normalized to [0, 1]
+    xy = (torch.sigmoid(output[:, :, 0:2]) + offsets) / size
+    half_wh = torch.exp(output[:, :, 2:4]) * anchor_wh / (2. * size)
+    det_confs = torch.sigmoid(output[:, :, 4:5])
+
+    cls_confs, cls_max_ids = decode_classes(output[:, :, 5:5+num_classes], det_confs, num_classes,
+                                            class_activation, dim=2)
+
+    # boxes = [x1, y1, x2, y2, det_confs, cls_confs, cls_max_ids]
+    boxes = torch.cat([torch.clamp_min(xy - half_wh, 0.), torch.clamp_max(xy + half_wh, 1.),
+                       det_confs, cls_confs, cls_max_ids], dim=2)
+    boxes = boxes.permute(0, 1, 3, 4, 2).reshape(batch, -1, 7)
 
     # for b in range(batch):
     #     boxes = []
@@ -235,6 +317,25 @@ def get_region_boxes(output, obj_thresh, num_classes, anchors, num_anchors, only
     #     all_boxes.append(boxes)
     return boxes
 
+def get_compact_boxes(output, obj_thresh, num_classes, anchor_wh, class_activation='softmax'):
+    # output is (batch, num_anchors, 5+num_classes, h, w), anchor_wh (num_anchors, 2) in cells
+    h, w = output.shape[3:]
+    det_confs = torch.sigmoid(output[:, :, 4])
+    batch_ids, anchor_ids, cy, cx = (det_confs > obj_thresh).nonzero(as_tuple=True)
+    # (M, 5+num_classes) predictions of the surviving cells only
+    cells = output[batch_ids, anchor_ids, :, cy, cx]
+    det_confs = det_confs[batch_ids, anchor_ids, cy, cx].unsqueeze(1)
+
+    size = torch.tensor([w, h], dtype=output.dtype, device=output.device)
+    xy = (torch.sigmoid(cells[:, 0:2]) + torch.stack([cx, cy], dim=1).to(output.dtype)) / size
+    half_wh = torch.exp(cells[:, 2:4]) * anchor_wh[anchor_ids] / (2. * size)
+    cls_confs, cls_max_ids = decode_classes(cells[:, 5:5+num_classes], det_confs, num_classes,
+                                            class_activation, dim=1)
+
+    boxes = torch.cat([torch.clamp_min(xy - half_wh, 0.), torch.clamp_max(xy + half_wh, 1.),
+                       det_confs, cls_confs, cls_max_ids], dim=1)
+    return boxes, batch_ids
+
 # def get_all_boxes(output, conf_thresh, num_classes, only_objectness=1, validation=False, use_cuda=True):
 #     # total number of inputs (batch size)
 #     # first element (x) for first tuple (x, anchor_mask, num_anchor)
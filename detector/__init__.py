@@ -1,9 +1,34 @@
 from .YOLOv3 import YOLOv3
+from .track_guided import TrackGuidedDetector
+from .motion_gate import MotionGate, MotionGatedDetector
+from .cascade import CascadeDetector
+from .resolution import ResolutionController, AdaptiveResolutionDetector
 
 
-__all__ = ['build_detector']
+__all__ = ['build_detector', 'TrackGuidedDetector', 'MotionGate', 'MotionGatedDetector', 'CascadeDetector',
+           'ResolutionController', 'AdaptiveResolutionDetector']
+
+def build_yolov3(cfg_yolov3, use_cuda, **kwargs):
+    options = dict(score_thresh=cfg_yolov3.SCORE_THRESH, nms_thresh=cfg_yolov3.NMS_THRESH, 
+                    is_xywh=True, use_cuda=use_cuda,
+                    classes=cfg_yolov3.get('CLASSES'), pre_nms_topk=cfg_yolov3.get('PRE_NMS_TOPK', -1),
+                    fuse=cfg_yolov3.get('FUSE', False),
+                    backend=cfg_yolov3.get('BACKEND', 'eager'), model_path=cfg_yolov3.get('BACKEND_MODEL'),
+                    tile_size=cfg_yolov3.get('TILE_SIZE', 0), tile_overlap=cfg_yolov3.get('TILE_OVERLAP', 0.2),
+                    max_tiles=cfg_yolov3.get('MAX_TILES', -1), input_sizes=cfg_yolov3.get('INPUT_SIZES'))
+    options.update(kwargs)
+    return YOLOv3(cfg_yolov3.CFG, cfg_yolov3.WEIGHT, cfg_yolov3.CLASS_NAMES, **options)
 
 def build_detector(cfg, use_cuda):
-    return YOLOv3(cfg.YOLOV3.CFG, cfg.YOLOV3.WEIGHT, cfg.YOLOV3.CLASS_NAMES, 
-                    score_thresh=cfg.YOLOV3.SCORE_THRESH, nms_thresh=cfg.YOLOV3.NMS_THRESH, 
-                    is_xywh=True, use_cuda=use_cuda)
+    if 'CASCADE' not in cfg:
+        return build_yolov3(cfg.YOLOV3, use_cuda)
+
+    # yolov3-tiny on every frame, YOLOv3 on demand
+    score_thresh, margin = cfg.YOLOV3_TINY.SCORE_THRESH, cfg.CASCADE.get('SCORE_MARGIN', 0.15)
+    fast = build_yolov3(cfg.YOLOV3_TINY, use_cuda, score_thresh=max(score_thresh - margin, 0.))
+    accurate = build_yolov3(cfg.YOLOV3, use_cuda)
+    return CascadeDetector(fast, accurate, score_thresh=score_thresh, score_margin=margin,
+                           refresh_interval=cfg.CASCADE.get('REFRESH_INTERVAL', 15),
+                           max_regions=cfg.CASCADE.get('MAX_REGIONS', 4),
+                           roi_scale=cfg.CASCADE.get('ROI_SCALE', 2.),
+                           roi_min_size=cfg.CASCADE.get('ROI_MIN_SIZE', 96))
@@ -0,0 +1,94 @@
+import numpy as np
+
+from .regions import box_tlwh, concat, replace_inside, select, square_regions
+
+
+class CascadeDetector(object):
+    """
+    Run a fast detector on every frame and an accurate one only on demand.
+
+    The fast detector (e.g. yolov3-tiny) must keep boxes down to
+    `score_thresh - score_margin`. Its boxes scoring at least
+    `score_thresh + score_margin` are accepted as they are; the accurate
+    detector (e.g. YOLOv3) is escalated to:
+
+    * the whole frame every `refresh_interval` frames, and when there are
+      more than `max_regions` regions to escalate,
+    * square regions around the ambiguous fast boxes, scoring within
+      `score_margin` of `score_thresh`,
+    * square regions around the tracks the tracker started but has not yet
+      confirmed, when a tracker is attached.
+
+    Attributes:
+        fast: Detector run on every frame
+        accurate: `YOLOv3` run on demand, it needs `detect_regions`
+        tracker: Optional DeepSORT `Tracker` whose new tracks trigger escalation
+        num_frames, num_full, num_region_frames, num_regions: Escalation counters
+    """
+
+    def __init__(self, fast, accurate, tracker=None, score_thresh=0.5, score_margin=0.15,
+                 refresh_interval=15, max_regions=4, roi_scale=2., roi_min_size=96):
+        self.fast = fast
+        self.accurate = accurate
+        self.tracker = tracker
+        self.class_names = accurate.class_names
+        self.score_thresh = score_thresh
+        self.score_margin = score_margin
+        self.refresh_interval = refresh_interval
+        self.max_regions = max_regions
+        self.roi_scale = roi_scale
+        self.roi_min_size = roi_min_size
+        self.is_xywh = accurate.is_xywh
+
+        self.num_frames = 0
+        self.num_full = 0
+        self.num_region_frames = 0
+        self.num_regions = 0
+
+    @property
+    def uses_tracker(self):
+        return self.tracker is not None
+
+    def __call__(self, ori_img):
+        height, width = ori_img.shape[:2]
+        self.num_frames += 1
+        if self.refresh_interval > 0 and (self.num_frames - 1) % self.refresh_interval == 0:
+            return self._full(ori_img)
+
+        detections = self.fast(ori_img)
+        bbox, cls_conf, cls_ids = detections
+        if bbox is None:
+            bbox, cls_conf = np.zeros((0, 4)), np.zeros(0)
+        accepted = cls_conf >= self.score_thresh + self.score_margin
+        ambiguous = ~accepted & (cls_conf >= self.score_thresh - self.score_margin)
+
+        boxes = [box_tlwh(bbox[ambiguous], self.is_xywh)]
+        if self.tracker is not None:
+            boxes.append([t.to_tlwh() for t in self.tracker.tracks if t.is_tentative()])
+        boxes = np.concatenate([np.reshape(b, (-1, 4)) for b in boxes])
+
+        detections = select(detections, accepted)
+        if len(boxes) == 0:
+            return detections
+        regions = square_regions(boxes, width, height, self.roi_scale, self.roi_min_size)
+        if len(regions) > self.max_regions:
+            return self._full(ori_img)
+
+        self.num_region_frames += 1
+        self.num_regions += len(regions)
+        side = regions[0][2]
+        size = min(side, self.accurate.size[0]), min(side, self.accurate.size[1])
+        escalated = self.accurate.detect_regions(ori_img, regions, size)
+        return replace_inside(escalated, detections, regions, self.is_xywh)
+
+    def _full(self, ori_img):
+        self.num_full += 1
+        return concat(self.accurate(ori_img))
+
+    def report(self):
+        """
+        Returns:
+            str: How often the accurate detector was escalated to
+        """
+        return ("cascade: accurate detector on {} of {} frames in full, on {} frames in {} regions"
+                .format(self.num_full, self.num_frames, self.num_region_frames, self.num_regions))
@@ -0,0 +1,151 @@
+import cv2
+import numpy as np
+
+from .YOLOv3.tiling import tile_grid
+from .regions import replace_inside
+
+
+class MotionGate(object):
+    """
+    Cheap change detector on a downscaled grayscale frame.
+
+    Frames are shrunk to `width` pixels with area interpolation, so each cell
+    of the small frame is the mean of a block of the original one, and then
+    compared cell by cell with the reference frame taken at the last
+    detection. A cell changed when its gray level moved by more than
+    `pixel_thresh`, a frame or tile when more than `area_thresh` of its cells
+    changed.
+
+    Attributes:
+        width: Width of the downscaled frame
+        pixel_thresh: Smallest gray level difference of a changed cell
+        area_thresh: Smallest fraction of changed cells that triggers detection
+        max_skip: Detect at the latest after this many skipped frames
+    """
+
+    def __init__(self, width=320, pixel_thresh=8, area_thresh=0.0005, max_skip=15):
+        self.width = width
+        self.pixel_thresh = pixel_thresh
+        self.area_thresh = area_thresh
+        self.max_skip = max_skip
+        self.reference = None
+
+    def downscale(self, img):
+        height, width = img.shape[:2]
+        size = (min(self.width, width), max(1, int(round(height * min(self.width, width) / float(width)))))
+        small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        return small
+
+    def changed_cells(self, small):
+        """Boolean mask of the cells that differ from the reference, None without a usable reference."""
+        if self.reference is None or self.reference.shape != small.shape:
+            return None
+        return cv2.absdiff(small, self.reference) > self.pixel_thresh
+
+    def changed(self, cells):
+        return cells.mean() > self.area_thresh if cells.size else False
+
+
+class MotionGatedDetector(object):
+    """
+    Skip detection on frames, or tiles, that did not change since they were
+    last detected.
+
+    On a skipped frame the previous detections are returned and
+    `last_skipped` is set, so the caller can advance the tracker by Kalman
+    prediction only. When the wrapped `YOLOv3` runs in tiled mode, only the
+    changed tiles are detected again and the previous detections are kept
+    everywhere else.
+
+    Attributes:
+        detector: Wrapped detector, e.g. `YOLOv3` or `TrackGuidedDetector`
+        gate: `MotionGate` deciding what changed
+        last_skipped: Whether the last call skipped detection entirely
+        num_frames, num_skipped: Frames seen and frames skipped
+        num_tiles, num_tiles_skipped: Tiles seen and tiles skipped in tiled mode
+    """
+
+    def __init__(self, detector, gate):
+        self.detector = detector
+        self.gate = gate
+        self.last_skipped = False
+        self._last = None, None, None
+        self._since_full = 0
+
+        self.num_frames = 0
+        self.num_skipped = 0
+        self.num_tiles = 0
+        self.num_tiles_skipped = 0
+
+    @property
+    def skip_rate(self):
+        return self.num_skipped / float(max(self.num_frames, 1))
+
+    def __call__(self, ori_img):
+        self.num_frames += 1
+        small = self.gate.downscale(ori_img)
+        cells = self.gate.changed_cells(small)
+        # partially detected frames do not count, stale tiles get refreshed too
+        force = cells is None or self._since_full >= self.gate.max_skip
+
+        if getattr(self.detector, 'tile_size', 0) > 0:
+            return self._detect_tiles(ori_img, small, cells, force)
+
+        if not force and not self.gate.changed(cells):
+            return self._skip()
+        self.gate.reference = small
+        return self._detected(self.detector(ori_img))
+
+    def _detect_tiles(self, ori_img, small, cells, force):
+        height, width = ori_img.shape[:2]
+        tiles = tile_grid(width, height, self.detector.tile_size, self.detector.tile_overlap,
+                          self.detector.max_tiles)
+        self.num_tiles += len(tiles)
+        if force:
+            self.gate.reference = small
+            return self._detected(self.detector.detect_regions(ori_img, tiles))
+
+        # tile rectangles in cells of the downscaled frame
+        sx, sy = small.shape[1] / float(width), small.shape[0] / float(height)
+        cell_tiles = [(int(x * sx), int(y * sy), int(np.ceil((x + w) * sx)), int(np.ceil((y + h) * sy)))
+                      for x, y, w, h in tiles]
+        changed = [i for i, (x1, y1, x2, y2) in enumerate(cell_tiles)
+                   if self.gate.changed(cells[y1:y2, x1:x2])]
+        self.num_tiles_skipped += len(tiles) - len(changed)
+        if not changed:
+            return self._skip()
+
+        for i in changed:
+            x1, y1, x2, y2 = cell_tiles[i]
+            self.gate.reference[y1:y2, x1:x2] = small[y1:y2, x1:x2]
+        changed = [tiles[i] for i in changed]
+        detections = self.detector.detect_regions(ori_img, changed)
+        # keep the previous detections centered outside of the detected tiles
+        detections = replace_inside(detections, self._last, changed, self.detector.is_xywh)
+        return self._detected(detections, full=False)
+
+    def _skip(self):
+        self.num_skipped += 1
+        self._since_full += 1
+        self.last_skipped = True
+        return self._last
+
+    def _detected(self, detections, full=True):
+        self._since_full = 0 if full else self._since_full + 1
+        self.last_skipped = False
+        self._last = detections
+        return detections
+
+    def report(self):
+        """
+        Returns:
+            str: Skip rate over frames, and over tiles in tiled mode
+        """
+        line = "motion gate: skipped {} of {} frames ({:.1f}%)".format(
+            self.num_skipped, self.num_frames, 100. * self.skip_rate)
+        if self.num_tiles:
+            line += ", {} of {} tiles ({:.1f}%)".format(
+                self.num_tiles_skipped, self.num_tiles, 100. * self.num_tiles_skipped / self.num_tiles)
+        return line
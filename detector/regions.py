@@ -0,0 +1,75 @@
+"""
+Helpers shared by the detectors that only look at parts of a frame.
+
+Detections are `(bbox, cls_conf, cls_ids)` tuples as returned by `YOLOv3`,
+`(None, None, None)` when empty.
+"""
+import math
+
+import numpy as np
+
+
+def square_regions(boxes_tlwh, width, height, scale=2., min_size=96):
+    """
+    Square regions of one common side centered on boxes.
+
+    The side is `scale` times the largest box side, at least `min_size`,
+    rounded up to a multiple of 32 so the regions batch through the network
+    at native resolution, and clipped to the largest multiple of 32 that fits
+    in the frame.
+
+    Args:
+        boxes_tlwh (ndarray): (N, 4) boxes `(top left x, top left y, width, height)`
+        width, height (int): Frame size in pixels
+
+    Returns:
+        list: `(x, y, side, side)` regions, one per box
+    """
+    boxes_tlwh = np.asarray(boxes_tlwh, dtype=np.float64).reshape(-1, 4)
+    side = max(min_size, scale * boxes_tlwh[:, 2:].max()) if len(boxes_tlwh) else min_size
+    side = max(min(int(math.ceil(side / 32.)) * 32, width // 32 * 32, height // 32 * 32), 32)
+    centers = boxes_tlwh[:, :2] + boxes_tlwh[:, 2:] / 2.
+    x = np.clip(np.round(centers[:, 0] - side / 2.), 0, max(width - side, 0)).astype(int)
+    y = np.clip(np.round(centers[:, 1] - side / 2.), 0, max(height - side, 0)).astype(int)
+    return [(int(x[i]), int(y[i]), side, side) for i in range(len(boxes_tlwh))]
+
+
+def box_centers(bbox, is_xywh=True):
+    return bbox[:, :2] if is_xywh else (bbox[:, :2] + bbox[:, 2:]) / 2.
+
+
+def box_tlwh(bbox, is_xywh=True):
+    if is_xywh:
+        return np.concatenate([bbox[:, :2] - bbox[:, 2:] / 2., bbox[:, 2:]], axis=1)
+    return np.concatenate([bbox[:, :2], bbox[:, 2:] - bbox[:, :2]], axis=1)
+
+
+def inside_regions(points, regions):
+    """Boolean mask of the (N, 2) `points` lying in any of the `(x, y, w, h)` regions."""
+    inside = np.zeros(len(points), dtype=bool)
+    for x, y, w, h in regions:
+        inside |= ((points[:, 0] >= x) & (points[:, 0] < x + w) &
+                   (points[:, 1] >= y) & (points[:, 1] < y + h))
+    return inside
+
+
+def select(detections, mask):
+    bbox, cls_conf, cls_ids = detections
+    if bbox is None or not mask.any():
+        return None, None, None
+    return bbox[mask], cls_conf[mask], cls_ids[mask]
+
+
+def concat(*detections):
+    detections = [d for d in detections if d[0] is not None and len(d[0])]
+    if not detections:
+        return None, None, None
+    return tuple(np.concatenate(parts) for parts in zip(*detections))
+
+
+def replace_inside(detections, previous, regions, is_xywh=True):
+    """`detections` of `regions`, plus the `previous` detections centered outside of them."""
+    if previous[0] is None:
+        return concat(detections)
+    outside = ~inside_regions(box_centers(previous[0], is_xywh), regions)
+    return concat(detections, select(previous, outside))
@@ -0,0 +1,148 @@
+import time
+
+from .regions import box_tlwh
+
+
+def _area(size):
+    return size[0] * size[1]
+
+
+class ResolutionController(object):
+    """
+    Pick the detector input size from the latency budget, the backlog of
+    frames waiting for detection and the size of the targets.
+
+    Detection time is modelled as proportional to the input pixels, with an
+    exponential moving average of the measured seconds per pixel, so every
+    measurement updates the estimate of every size. Each frame gets:
+
+    * an upper bound, the largest size whose estimated latency fits the
+      budget. With `queue_depth` frames waiting, the budget shrinks to
+      `latency_budget * drain_frames / (drain_frames + queue_depth)` so the
+      backlog drains within about `drain_frames` frames. Switching to a larger
+      size needs the estimate to fit `headroom` times the budget, so the size
+      does not flap around the budget;
+    * a lower bound from the targets, the smallest size at which the smallest
+      target still spans `min_target_size` input pixels. Without targets it is
+      the largest size.
+
+    The smaller of the two is used, so under load the resolution degrades
+    instead of frames being dropped.
+
+    Attributes:
+        sizes: Candidate (width, height) input sizes, smallest first
+        latency_budget: Seconds available to detect one frame
+        current: Size picked by the last `select`
+        counts: Number of frames detected at each size
+    """
+
+    def __init__(self, sizes, latency_budget, min_target_size=32, drain_frames=8, momentum=0.8, headroom=0.8):
+        self.sizes = sorted(sizes, key=_area)
+        self.latency_budget = latency_budget
+        self.min_target_size = min_target_size
+        self.drain_frames = drain_frames
+        self.momentum = momentum
+        self.headroom = headroom
+        self.current = self.sizes[-1]
+        self.counts = dict((size, 0) for size in self.sizes)
+        self._seconds_per_pixel = None
+
+    def estimate(self, size):
+        """Estimated detection latency in seconds at `size`, 0 before the first measurement."""
+        if self._seconds_per_pixel is None:
+            return 0.
+        return self._seconds_per_pixel * _area(size)
+
+    def update(self, size, latency):
+        """Record that detecting a frame at `size` took `latency` seconds."""
+        seconds_per_pixel = latency / float(_area(size))
+        if self._seconds_per_pixel is None:
+            self._seconds_per_pixel = seconds_per_pixel
+        else:
+            self._seconds_per_pixel = (self.momentum * self._seconds_per_pixel +
+                                       (1 - self.momentum) * seconds_per_pixel)
+
+    def select(self, queue_depth=0, target_height=None, input_scale=None):
+        """
+        Args:
+            queue_depth (int): Frames waiting to be detected
+            target_height (float): Height of the smallest target in frame pixels
+            input_scale (float): Input pixels per frame pixel at the height of
+                the largest size, needed with `target_height`
+
+        Returns:
+            tuple: (width, height) input size
+        """
+        budget = self.latency_budget * self.drain_frames / float(self.drain_frames + queue_depth)
+        fits = [size for size in self.sizes if self.estimate(size) <=
+                (budget if _area(size) <= _area(self.current) else self.headroom * budget)]
+        size = fits[-1] if fits else self.sizes[0]
+
+        if target_height:
+            largest = self.sizes[-1][1]
+            resolved = [s for s in self.sizes
+                        if target_height * input_scale * s[1] / float(largest) >= self.min_target_size]
+            if resolved and _area(resolved[0]) < _area(size):
+                size = resolved[0]
+
+        self.current = size
+        self.counts[size] += 1
+        return size
+
+
+class AdaptiveResolutionDetector(object):
+    """
+    Switch the input size of the `YOLOv3` at the end of a detector chain
+    before every frame, as picked by a `ResolutionController`.
+
+    The latency of the whole chain is measured, skipped frames of a
+    `MotionGatedDetector` excepted, and the smallest detected box of a frame
+    is the target size of the next one.
+
+    Attributes:
+        detector: Wrapped detector, `YOLOv3` or a wrapper around it
+        controller: `ResolutionController` picking the sizes
+        queue_depth: Optional callable returning the number of frames waiting
+    """
+
+    def __init__(self, detector, controller, queue_depth=None):
+        self.detector = detector
+        self.controller = controller
+        self.queue_depth = queue_depth
+        self.yolo = detector
+        while getattr(self.yolo, 'detector', None) is not None:
+            self.yolo = self.yolo.detector
+        self.class_names = self.yolo.class_names
+        self._target_height = None
+
+    @property
+    def last_skipped(self):
+        return getattr(self.detector, 'last_skipped', False)
+
+    def __call__(self, ori_img):
+        # input pixels per frame pixel at the largest size
+        side = self.yolo.tile_size if self.yolo.tile_size > 0 else ori_img.shape[0]
+        size = self.controller.select(self.queue_depth() if self.queue_depth else 0,
+                                      self._target_height, self.controller.sizes[-1][1] / float(side))
+        self.yolo.set_input_size(size)
+
+        start = time.time()
+        detections = self.detector(ori_img)
+        if not self.last_skipped:
+            self.controller.update(size, time.time() - start)
+
+        bbox = detections[0]
+        self._target_height = None
+        if bbox is not None and len(bbox):
+            self._target_height = box_tlwh(bbox, self.yolo.is_xywh)[:, 3].min()
+        return detections
+
+    def report(self):
+        """
+        Returns:
+            str: Share of the frames detected at each input size
+        """
+        total = max(sum(self.controller.counts.values()), 1)
+        return "adaptive resolution: " + ", ".join(
+            "{}x{} {:.1f}%".format(width, height, 100. * self.controller.counts[(width, height)] / total)
+            for width, height in self.controller.sizes)
@@ -0,0 +1,93 @@
+import numpy as np
+
+from .regions import square_regions
+
+
+class TrackGuidedDetector(object):
+    """
+    Detect only around the Kalman-predicted boxes of the current tracks.
+
+    Once the tracker holds tracks, most of a frame is background. Every frame
+    the boxes of the tracks are predicted one step ahead and padded square
+    regions around them go through the detector in a single batch, at native
+    resolution. A full-frame "discovery" detection still runs every
+    `discovery_interval` frames, whenever there is no track, and in the frame
+    after a confirmed track was missed, so new and lost people are found.
+
+    Attributes:
+        detector: `YOLOv3` instance
+        tracker: DeepSORT `Tracker` whose tracks guide the detection
+        discovery_interval: Run a full-frame detection at least every that many frames
+        roi_scale: Side of a region as a multiple of the larger track box side
+        roi_min_size: Smallest region side in pixels
+    """
+
+    uses_tracker = True
+
+    def __init__(self, detector, tracker, discovery_interval=10, roi_scale=2., roi_min_size=96):
+        self.detector = detector
+        self.tracker = tracker
+        self.discovery_interval = discovery_interval
+        self.roi_scale = roi_scale
+        self.roi_min_size = roi_min_size
+
+        self._since_discovery = 0
+        self.num_frames = 0
+        self.num_discovery = 0
+        self.roi_pixels = 0
+        self.frame_pixels = 0
+
+    def __call__(self, ori_img):
+        height, width = ori_img.shape[:2]
+        self.num_frames += 1
+        self.frame_pixels += width * height
+
+        regions = self.regions(width, height)
+        if regions is None:
+            self._since_discovery = 0
+            self.num_discovery += 1
+            self.roi_pixels += width * height
+            return self.detector(ori_img)
+
+        self._since_discovery += 1
+        side = regions[0][2]
+        self.roi_pixels += len(regions) * side * side
+        # a region is detected at native resolution, up to the network input size
+        size = min(side, self.detector.size[0]), min(side, self.detector.size[1])
+        return self.detector.detect_regions(ori_img, regions, size)
+
+    def regions(self, width, height):
+        """
+        Square regions around the predicted boxes of the tracks updated in the
+        last frame.
+
+        Returns:
+            list: `(x, y, side, side)` regions of a common side, or None when
+            the frame needs a full discovery detection
+        """
+        if self._since_discovery + 1 >= self.discovery_interval:
+            return None
+        # frames the tracks coasted through since the last update, skipped by a motion gate
+        missed = 1 + self.tracker.frames_since_update
+        tracks = [t for t in self.tracker.tracks if t.time_since_update <= missed]
+        if not tracks or any(t.is_confirmed() and t.time_since_update == missed for t in tracks):
+            return None
+
+        boxes = np.array([self.predict_tlwh(t) for t in tracks])
+        return square_regions(boxes, width, height, self.roi_scale, self.roi_min_size)
+
+    def predict_tlwh(self, track):
+        """Box `(top left x, top left y, width, height)` of `track` one step ahead."""
+        mean, _ = self.tracker.kf.predict(track.mean, track.covariance)
+        ret = mean[:4].copy()
+        ret[2] *= ret[3]
+        ret[:2] -= ret[2:] / 2
+        return ret
+
+    def report(self):
+        """
+        Returns:
+            str: Discovery frame count and the share of frame pixels detected
+        """
+        return "track guided detection: {} of {} frames full, {:.1f}% of frame pixels detected".format(
+            self.num_discovery, self.num_frames, 100. * self.roi_pixels / max(self.frame_pixels, 1))
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the inference build of the YOLOv3 Darknet"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import copy
+import os.path as osp
+import sys
+
+import torch
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+YOLO_DIR = osp.join(PARENT_DIR, 'detector/YOLOv3')
+sys.path.append(PARENT_DIR)
+sys.path.append(YOLO_DIR)
+
+from darknet import Darknet
+
+
+def build_random_darknet(cfgfile):
+  """Darknet in eval mode with non-trivial BatchNorm statistics"""
+  torch.manual_seed(0)
+  net = Darknet(cfgfile)
+  for module in net.modules():
+    if isinstance(module, torch.nn.BatchNorm2d):
+      module.running_mean.uniform_(-0.1, 0.1)
+      module.running_var.uniform_(0.5, 1.5)
+      module.weight.data.uniform_(0.5, 1.5)
+      module.bias.data.uniform_(-0.1, 0.1)
+  return net.eval()
+
+
+def check_fused_matches_unfused(cfgfile, memory_format=torch.contiguous_format):
+  net = build_random_darknet(cfgfile)
+  fused = copy.deepcopy(net).fuse().to(memory_format=memory_format)
+  assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules())
+
+  x = torch.rand(2, 3, net.height, net.width)
+  with torch.no_grad():
+    expected = net(x)
+    actual = fused(x.contiguous(memory_format=memory_format))
+
+  assert len(expected) == len(actual)
+  for outno in expected:
+    e, a = expected[outno]['x'], actual[outno]['x']
+    assert e.shape == a.shape
+    diff = (e - a).abs().max().item()
+    print('Fused output difference: {}'.format(diff))
+    assert torch.allclose(e, a, rtol=1e-4, atol=1e-4)
+
+
+def test_fuse_yolov3_tiny():
+  check_fused_matches_unfused(osp.join(YOLO_DIR, 'cfg/yolov3-tiny.cfg'))
+
+
+def test_fuse_yolov3_tiny_channels_last():
+  check_fused_matches_unfused(osp.join(YOLO_DIR, 'cfg/yolov3-tiny.cfg'), torch.channels_last)
+
+
+def test_fuse_yolov3():
+  check_fused_matches_unfused(osp.join(YOLO_DIR, 'cfg/yolo_v3.cfg'))
+
+
+def test():
+  test_fuse_yolov3_tiny()
+  test_fuse_yolov3_tiny_channels_last()
+  test_fuse_yolov3()
+
+
+if __name__ == '__main__':
+  test()
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the batched DeepSORT Kalman filter"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os.path as osp
+import sys
+
+import numpy as np
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+sys.path.append(PARENT_DIR)
+
+from deep_sort.sort.kalman_filter import KalmanFilter
+
+
+def random_states(kf, n, seed=0):
+  """n tracks started from random boxes and run for a few noisy steps"""
+  rng = np.random.RandomState(seed)
+  means, covariances = [], []
+  for _ in range(n):
+    measurement = np.array([rng.uniform(0, 1920), rng.uniform(0, 1080),
+                            rng.uniform(0.3, 0.7), rng.uniform(40, 400)])
+    mean, covariance = kf.initiate(measurement)
+    for _ in range(3):
+      mean, covariance = kf.predict(mean, covariance)
+      mean, covariance = kf.update(mean, covariance, measurement + rng.normal(0, 2, 4))
+    means.append(mean)
+    covariances.append(covariance)
+  return np.array(means), np.array(covariances)
+
+
+def random_measurements(m, seed=1):
+  rng = np.random.RandomState(seed)
+  return np.stack([rng.uniform(0, 1920, m), rng.uniform(0, 1080, m),
+                   rng.uniform(0.3, 0.7, m), rng.uniform(40, 400, m)], axis=1)
+
+
+def test_predict_batch_matches_predict():
+  kf = KalmanFilter()
+  means, covariances = random_states(kf, 50)
+  batch_means, batch_covariances = kf.predict_batch(means, covariances)
+  for i in range(len(means)):
+    mean, covariance = kf.predict(means[i], covariances[i])
+    np.testing.assert_allclose(batch_means[i], mean, rtol=1e-12)
+    np.testing.assert_allclose(batch_covariances[i], covariance, rtol=1e-12)
+
+
+def test_project_batch_matches_project():
+  kf = KalmanFilter()
+  means, covariances = random_states(kf, 50)
+  batch_means, batch_covariances = kf.project_batch(means, covariances)
+  for i in range(len(means)):
+    mean, covariance = kf.project(means[i], covariances[i])
+    np.testing.assert_allclose(batch_means[i], mean, rtol=1e-12)
+    np.testing.assert_allclose(batch_covariances[i], covariance, rtol=1e-12)
+
+
+def test_update_batch_matches_update():
+  kf = KalmanFilter()
+  means, covariances = kf.predict_batch(*random_states(kf, 50))
+  measurements = means[:, :4] + np.random.RandomState(2).normal(0, 5, (50, 4))
+  batch_means, batch_covariances = kf.update_batch(means, covariances, measurements)
+  for i in range(len(means)):
+    mean, covariance = kf.update(means[i], covariances[i], measurements[i])
+    np.testing.assert_allclose(batch_means[i], mean, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(batch_covariances[i], covariance, rtol=1e-9, atol=1e-9)
+
+
+def test_gating_distance_batch_matches_gating_distance():
+  kf = KalmanFilter()
+  means, covariances = random_states(kf, 20)
+  measurements = random_measurements(30)
+  for only_position in (False, True):
+    distances = kf.gating_distance_batch(means, covariances, measurements, only_position)
+    assert distances.shape == (20, 30)
+    for i in range(len(means)):
+      expected = kf.gating_distance(means[i], covariances[i], measurements, only_position)
+      np.testing.assert_allclose(distances[i], expected, rtol=1e-9)
+
+
+def test_batches_of_no_states():
+  kf = KalmanFilter()
+  means, covariances = np.zeros((0, 8)), np.zeros((0, 8, 8))
+  assert kf.predict_batch(means, covariances)[1].shape == (0, 8, 8)
+  assert kf.gating_distance_batch(means, covariances, random_measurements(3)).shape == (0, 3)
@@ -0,0 +1,47 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the ring-buffer gallery of the DeepSORT appearance metric"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os.path as osp
+import sys
+
+import numpy as np
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+sys.path.append(PARENT_DIR)
+
+from deep_sort.sort.nn_matching import NearestNeighborDistanceMetric, _pdist
+
+
+def test_budget_keeps_the_latest_samples():
+  metric = NearestNeighborDistanceMetric('euclidean', 0.2, budget=3)
+  for i in range(5):
+    metric.partial_fit(np.full((2, 4), i, dtype=np.float32), [1, 2], [1, 2])
+  np.testing.assert_array_equal(metric.samples[1][:, 0], [2, 3, 4])
+
+  metric.partial_fit(np.zeros((0, 4), dtype=np.float32), [], [2])
+  assert list(metric.samples) == [2]
+
+
+def test_distance_matches_nearest_sample():
+  rng = np.random.RandomState(0)
+  metric = NearestNeighborDistanceMetric('euclidean', 0.2)
+  samples = dict((target, []) for target in range(40))
+  for _ in range(20):
+    targets = rng.randint(40, size=30)
+    features = rng.randn(30, 8)
+    metric.partial_fit(features, targets, list(samples))
+    for feature, target in zip(features, targets):
+      samples[target].append(feature)
+
+  queries = rng.randn(5, 8)
+  distances = metric.distance(queries, list(samples))
+  for i, target in enumerate(samples):
+    np.testing.assert_allclose(distances[i], _pdist(samples[target], queries).min(axis=0),
+                               rtol=1e-9, atol=1e-9)
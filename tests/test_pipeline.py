@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the pipelined execution engine"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os.path as osp
+import sys
+import time
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+sys.path.append(PARENT_DIR)
+
+from utils.pipeline import Pipeline
+
+
+def check_stop_returns_every_pulled_item(queue_size):
+  pulled = []
+
+  def source():
+    for i in range(30):
+      pulled.append(i)
+      yield i
+
+  def slow(item):
+    time.sleep(0.001)
+    return item
+
+  pipeline = Pipeline([('a', slow), ('b', slow), ('c', slow)], queue_size=queue_size)
+  consumed = []
+  for item in pipeline.run(source()):
+    consumed.append(item)
+    if item == 10:
+      pipeline.stop()
+      break
+
+  unfinished = pipeline.unfinished()
+  assert consumed == list(range(11))
+  # nothing pulled is lost, and the unfinished items follow the last consumed one
+  assert consumed + unfinished == pulled
+
+
+def test_stop_returns_every_pulled_item():
+  for queue_size in (0, 1, 2, 4):
+    for _ in range(5):
+      check_stop_returns_every_pulled_item(queue_size)
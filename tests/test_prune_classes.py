@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for pruning the YOLO heads to a class subset"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import copy
+import os.path as osp
+import sys
+
+import torch
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+YOLO_DIR = osp.join(PARENT_DIR, 'detector/YOLOv3')
+sys.path.append(PARENT_DIR)
+sys.path.append(YOLO_DIR)
+
+from darknet import Darknet
+from prune_classes import head_channels, prune, prune_classes
+from yolo_layer import YoloLayer
+from yolo_utils import get_all_boxes
+
+CFGFILE = osp.join(YOLO_DIR, 'cfg/yolov3-tiny.cfg')
+NAMESFILE = osp.join(YOLO_DIR, 'cfg/coco.names')
+
+
+def build_random_darknet():
+  """Darknet in eval mode with random weights and BatchNorm statistics"""
+  torch.manual_seed(0)
+  net = Darknet(CFGFILE)
+  for module in net.modules():
+    if isinstance(module, torch.nn.BatchNorm2d):
+      module.running_mean.uniform_(-0.1, 0.1)
+      module.running_var.uniform_(0.5, 1.5)
+  return net.eval()
+
+
+def heads(net):
+  return [m for m in net.models if isinstance(m, YoloLayer)]
+
+
+def test_pruned_heads_are_sliced_heads():
+  net = build_random_darknet()
+  pruned = prune_classes(copy.deepcopy(net), [0])
+  x = torch.rand(1, 3, net.height, net.width)
+  with torch.no_grad():
+    expected, actual = net(x), pruned(x)
+
+  for outno, layer in enumerate(heads(net)):
+    channels = head_channels(len(layer.anchor_mask), 80, [0])
+    assert actual[outno]['x'].shape[1] == len(channels) == 18
+    assert torch.allclose(actual[outno]['x'], expected[outno]['x'][:, channels], rtol=1e-5, atol=1e-5)
+
+
+def test_pruned_person_boxes_match_logistic_unpruned():
+  net = build_random_darknet()
+  # random heads hardly ever score person best, favour it in some cells
+  for layer in heads(net):
+    conv = net.models[list(net.models).index(layer) - 1][0]
+    with torch.no_grad():
+      conv.bias[[anchor * 85 + 5 for anchor in range(len(layer.anchor_mask))]] += 0.08
+  pruned = prune_classes(copy.deepcopy(net), [0])
+  # the unpruned net decoded with the same activation as the pruned one
+  for layer in heads(net):
+    layer.class_activation = 'logistic'
+  x = torch.rand(1, 3, net.height, net.width)
+  with torch.no_grad():
+    expected = get_all_boxes(net(x), 0., 80, use_cuda=False)[0]
+    actual = get_all_boxes(pruned(x), 0., 1, use_cuda=False)[0]
+
+  assert actual.shape == expected.shape
+  # same boxes and objectness for every anchor cell
+  assert torch.allclose(actual[:, :5], expected[:, :5], rtol=1e-5, atol=1e-5)
+  assert (actual[:, 6] == 0).all()
+  # same person score wherever person is the best of the 80 classes
+  person = expected[:, 6] == 0
+  assert person.any()
+  assert torch.allclose(actual[person, 5], expected[person, 5], rtol=1e-5, atol=1e-5)
+  # elsewhere the person score is below the best class score
+  assert (actual[~person, 5] <= expected[~person, 5] + 1e-6).all()
+
+
+def test_pruned_files_load_back(tmpdir):
+  net = build_random_darknet()
+  weightfile = str(tmpdir.join('random.weights'))
+  net.save_weights(weightfile)
+  cfgfile, weightfile, namesfile = prune(CFGFILE, weightfile, NAMESFILE, [0], str(tmpdir.join('person')))
+
+  loaded = Darknet(cfgfile)
+  loaded.load_weights(weightfile)
+  loaded.eval()
+  assert [layer.class_activation for layer in heads(loaded)] == ['logistic', 'logistic']
+  with open(namesfile) as fp:
+    assert fp.read().split() == ['person']
+
+  pruned = prune_classes(copy.deepcopy(net), [0])
+  x = torch.rand(1, 3, net.height, net.width)
+  with torch.no_grad():
+    expected, actual = pruned(x), loaded(x)
+  for outno in expected:
+    assert torch.allclose(actual[outno]['x'], expected[outno]['x'], rtol=1e-5, atol=1e-5)
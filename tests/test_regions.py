@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the detectors running the network on regions of a frame"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os.path as osp
+import sys
+
+import numpy as np
+import torch
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+YOLO_DIR = osp.join(PARENT_DIR, 'detector/YOLOv3')
+sys.path.append(PARENT_DIR)
+sys.path.append(YOLO_DIR)
+
+from darknet import Darknet
+
+from detector.cascade import CascadeDetector
+from detector.regions import square_regions
+from detector.YOLOv3 import YOLOv3
+
+
+def build_random_yolov3(tmpdir, cfgfile):
+  """YOLOv3 on cpu with random weights"""
+  torch.manual_seed(0)
+  weightfile = str(tmpdir.join('random.weights'))
+  Darknet(cfgfile).save_weights(weightfile)
+  return YOLOv3(cfgfile, weightfile, osp.join(YOLO_DIR, 'cfg/coco.names'), use_cuda=False)
+
+
+def test_square_regions_fit_the_network_stride():
+  # a tall box in a 640x360 frame would need a 384 pixel region
+  regions = square_regions([[300, 80, 90, 190]], 640, 360)
+  assert regions == [(169, 0, 352, 352)]
+  for width, height in ((640, 360), (1280, 720), (500, 333)):
+    for x, y, side, _ in square_regions([[10, 10, 200, 300], [400, 200, 30, 60]], width, height):
+      assert side % 32 == 0 and x + side <= width and y + side <= height
+
+
+def test_cascade_frame_smaller_than_the_network_input(tmpdir):
+  accurate = build_random_yolov3(tmpdir, osp.join(YOLO_DIR, 'cfg/yolo_v3.cfg'))
+  ambiguous_box = np.array([[300., 80., 390., 270.]])  # xyxy, taller than half the frame
+  fast = lambda img: (ambiguous_box, np.array([0.5]), np.array([0]))
+  cascade = CascadeDetector(fast, accurate, refresh_interval=0)
+
+  frame = np.random.RandomState(0).randint(0, 256, (360, 640, 3)).astype(np.uint8)
+  bbox, cls_conf, cls_ids = cascade(frame)
+  assert cascade.num_regions == 1
+  assert bbox is None or len(bbox) == len(cls_conf) == len(cls_ids)
@@ -0,0 +1,44 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the struct-of-arrays DeepSORT track table"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os.path as osp
+import sys
+
+import numpy as np
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+sys.path.append(PARENT_DIR)
+
+from deep_sort.sort.track import Track, TrackState, TrackTable
+
+
+def test_views_follow_their_rows():
+  table = TrackTable(capacity=1)
+  tracks = [table.add(np.full(8, i, dtype=float), np.eye(8), i, 3, 30) for i in range(5)]
+  assert len(table) == 5
+  table.time_since_update[:] = [0, 1, 2, 3, 4]
+  table.state[[1, 3]] = TrackState.Deleted
+
+  table.compact(table.state != TrackState.Deleted)
+  assert [t.track_id for t in table.views()] == [0, 2, 4]
+  assert [t.time_since_update for t in table.views()] == [0, 2, 4]
+  assert tracks[2].mean[0] == 2
+
+  tracks[4].mean[0] = 40.
+  assert table.mean[2, 0] == 40.
+  # a removed track keeps its last values
+  assert tracks[3].track_id == 3 and tracks[3].is_deleted()
+
+
+def test_standalone_track():
+  track = Track(np.zeros(8), np.eye(8), 7, 3, 30, feature=np.ones(4))
+  assert track.is_tentative() and track.hits == 1 and len(track.features) == 1
+  track.mark_missed()
+  assert track.is_deleted()
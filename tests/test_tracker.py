@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the DeepSORT tracker on frames without detections"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os.path as osp
+import sys
+
+import numpy as np
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+sys.path.append(PARENT_DIR)
+
+from deep_sort.sort.detection import Detection
+from deep_sort.sort.nn_matching import NearestNeighborDistanceMetric
+from deep_sort.sort.tracker import Tracker
+
+
+def run(frames, tlwh=(100., 50., 40., 120.), step=(0., 0.)):
+  """Track one person moving by `step` per frame, detected on the frames
+  marked True and skipped (only predicted) on the others"""
+  tracker = Tracker(NearestNeighborDistanceMetric('cosine', 0.2, 100), n_init=3)
+  feature = np.ones(8, dtype=np.float32)
+  ids = []
+  for frame, detected in enumerate(frames):
+    tracker.predict()
+    if detected:
+      box = np.array(tlwh) + np.r_[step, 0., 0.] * frame
+      tracker.update([Detection(box, 0.9, feature)])
+    ids.append([(t.track_id, t.is_confirmed()) for t in tracker.tracks])
+  return ids
+
+
+def test_skipped_frame_within_n_init():
+  ids = run([True, False, True, True])
+  assert ids[-1] == [(1, True)]
+
+
+def test_alternating_skipped_frames():
+  ids = run([True, False] * 6, step=(3., 1.))
+  assert ids[4] == [(1, True)]
+  assert ids[-1] == [(1, True)]
+
+
+def test_missed_frame_within_n_init():
+  # a frame with detections missing the person still deletes the tentative track
+  tracker = Tracker(NearestNeighborDistanceMetric('cosine', 0.2, 100), n_init=3)
+  feature = np.ones(8, dtype=np.float32)
+  for detections in ([Detection(np.array([100., 50., 40., 120.]), 0.9, feature)], []):
+    tracker.predict()
+    tracker.update(detections)
+  assert tracker.tracks == []
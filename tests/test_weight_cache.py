@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the memory-mapped cache of the ReID checkpoint"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import os.path as osp
+import sys
+
+import torch
+
+CURRENT_DIR = osp.dirname(__file__)
+PARENT_DIR = osp.join(CURRENT_DIR, '..')
+sys.path.append(PARENT_DIR)
+
+from deep_sort.deep.model import Net
+from deep_sort.deep import weight_cache
+from deep_sort.deep.weight_cache import load_state_dict_cached
+
+
+def test_cache_round_trip(tmpdir):
+  path = str(tmpdir.join('ckpt.t7'))
+  state_dict = Net(reid=True).state_dict()
+  torch.save({'net_dict': state_dict}, path)
+
+  # the first load writes the cache, the second one reads it
+  load_state_dict_cached(path, 'net_dict')
+  cached = load_state_dict_cached(path, 'net_dict')
+  assert list(cached) == list(state_dict)
+  for name, tensor in state_dict.items():
+    assert cached[name].shape == tensor.shape, name
+    assert cached[name].dtype == tensor.dtype, name
+    assert torch.equal(cached[name], tensor), name
+
+
+def test_cache_hit_does_not_read_the_checkpoint(tmpdir, monkeypatch):
+  path = str(tmpdir.join('ckpt.t7'))
+  torch.save({'net_dict': Net(reid=True).state_dict()}, path)
+  load_state_dict_cached(path, 'net_dict')
+
+  def fail(*args, **kwargs):
+    raise AssertionError("the checkpoint was read on a cache hit")
+  monkeypatch.setattr(weight_cache, 'file_digest', fail)
+  monkeypatch.setattr(torch, 'load', fail)
+  load_state_dict_cached(path, 'net_dict')
+
+
+def test_retrained_checkpoint_gets_a_fresh_cache(tmpdir):
+  path = str(tmpdir.join('ckpt.t7'))
+  torch.manual_seed(0)
+  torch.save({'net_dict': Net(reid=True).state_dict()}, path)
+  load_state_dict_cached(path, 'net_dict')
+
+  state_dict = Net(reid=True).state_dict()
+  torch.save({'net_dict': state_dict}, path)
+  st = os.stat(path)
+  os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+  cached = load_state_dict_cached(path, 'net_dict')
+  for name, tensor in state_dict.items():
+    assert torch.equal(cached[name], tensor), name
@@ -0,0 +1,186 @@
+"""
+Threaded video frame reader.
+
+Decoding is moved to a background thread that fills a bounded queue, so the
+time spent in `cv2.VideoCapture.grab()`/`retrieve()` overlaps with detection
+and tracking on the consuming thread.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+
+# Drop policies applied when the consumer falls behind the decoder.
+POLICY_BLOCK = 'block'              # decoder waits, no frame is ever dropped
+POLICY_DROP_OLDEST = 'drop_oldest'  # oldest queued frame is discarded
+POLICY_LATEST = 'latest'            # only the most recent frame is kept
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_LATEST)
+
+_END_OF_STREAM = object()
+
+
+class FrameReader(object):
+    """
+    Background frame decoder with a bounded queue.
+
+    Frames are read from an opened `cv2.VideoCapture` on a daemon thread.
+    Frames that are skipped by `frame_interval` are only grabbed, never
+    decoded, exactly like the original `grab()`/`retrieve()` loop.
+
+    Attributes:
+        capture: OpenCV video capture object the frames are read from
+        policy: Drop policy, one of `POLICIES`
+        frame_interval: Only every `frame_interval`-th frame is decoded
+        num_decoded: Number of frames decoded so far
+        num_dropped: Number of decoded frames discarded by the drop policy
+    """
+
+    def __init__(self, capture, queue_size=8, policy=POLICY_BLOCK, frame_interval=1):
+        """
+        Initialize the reader. Call `start()` (or use it as a context manager)
+        to launch the decoder thread.
+
+        Args:
+            capture: Opened `cv2.VideoCapture`
+            queue_size (int): Maximum number of decoded frames held in memory
+            policy (str): What to do when the queue is full, see `POLICIES`
+            frame_interval (int): Decode only every `frame_interval`-th frame
+
+        Raises:
+            ValueError: If the policy is unknown or a size is not positive
+        """
+        if policy not in POLICIES:
+            raise ValueError("Invalid policy %r; must be one of %s" % (policy, ", ".join(POLICIES)))
+        if queue_size < 1 or frame_interval < 1:
+            raise ValueError("queue_size and frame_interval must be positive")
+
+        self.capture = capture
+        self.policy = policy
+        self.frame_interval = frame_interval
+        # latest-frame-wins is drop-oldest with room for a single frame
+        maxsize = 1 if policy == POLICY_LATEST else queue_size
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._finished = False
+
+        self.num_decoded = 0
+        self.num_dropped = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop()
+
+    def __iter__(self):
+        while True:
+            ok, idx_frame, frame = self.read()
+            if not ok:
+                return
+            yield idx_frame, frame
+
+    def start(self):
+        """
+        Launch the decoder thread.
+
+        Returns:
+            FrameReader: Self instance
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._decode_loop, name="FrameReader")
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the decoder thread and discard all queued frames."""
+        self._stop_event.set()
+        self._drain()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._drain()
+
+    def read(self):
+        """
+        Return the next decoded frame, blocking until one is available.
+
+        Returns:
+            tuple: `(ok, idx_frame, frame)` where `idx_frame` is the 1-based
+            index of the frame in the video. `ok` is False once the stream
+            is exhausted or the reader was stopped.
+        """
+        if self._finished:
+            return False, None, None
+        item = self._queue.get()
+        if item is _END_OF_STREAM:
+            self._finished = True
+            return False, None, None
+        return (True,) + item
+
+    def qsize(self):
+        """Return the approximate number of decoded frames waiting to be read."""
+        return self._queue.qsize()
+
+    def _decode_loop(self):
+        idx_frame = 0
+        try:
+            while not self._stop_event.is_set() and self.capture.grab():
+                idx_frame += 1
+                if idx_frame % self.frame_interval:
+                    continue
+                ok, frame = self.capture.retrieve()
+                if not ok:
+                    break
+                self.num_decoded += 1
+                self._put((idx_frame, frame))
+        finally:
+            # the end marker never displaces a frame, unless we were stopped
+            if not self._put_blocking(_END_OF_STREAM):
+                self._put_dropping(_END_OF_STREAM)
+
+    def _put(self, item):
+        if self.policy == POLICY_BLOCK:
+            self._put_blocking(item)
+        else:
+            self._put_dropping(item)
+
+    def _put_blocking(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _put_dropping(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if dropped is not _END_OF_STREAM:
+                    self.num_dropped += 1
+
+    def _drain(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is _END_OF_STREAM:
+                self._finished = True
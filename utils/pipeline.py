@@ -0,0 +1,274 @@
+"""
+Multi-stage pipelined execution engine.
+
+Every stage runs on its own worker thread and hands its result to the next
+stage through a bounded queue, so e.g. the detector can work on frame t+1
+while the tracker associates frame t and the writer encodes frame t-1.
+
+Each stage has exactly one worker and all queues are FIFO, so items leave
+the pipeline in the order they entered it and every stage sees them in that
+order too. Stateful stages such as DeepSORT therefore produce the same
+track identities as a sequential loop.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+
+_END = object()
+_POLL_INTERVAL = 0.05
+
+
+class _Failure(object):
+    def __init__(self, stage, exc):
+        self.stage = stage
+        self.exc = exc
+
+
+class StageStats(object):
+    """
+    Runtime statistics of a single pipeline stage.
+
+    Attributes:
+        name: Stage name
+        processed: Number of items the stage has finished
+        busy_time: Seconds spent inside the stage function
+        queue_size: Capacity of the stage input queue (0 if unbounded/inline)
+        depth_sum: Sum of the input queue depth sampled before every item
+        depth_max: Largest input queue depth observed
+    """
+
+    def __init__(self, name, queue_size):
+        self.name = name
+        self.queue_size = queue_size
+        self.processed = 0
+        self.busy_time = 0.
+        self.depth_sum = 0
+        self.depth_max = 0
+
+    def record(self, depth, busy):
+        self.processed += 1
+        self.busy_time += busy
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    @property
+    def mean_depth(self):
+        return self.depth_sum / self.processed if self.processed else 0.
+
+    def occupancy(self, elapsed):
+        """Fraction of `elapsed` wall time the stage spent working."""
+        return self.busy_time / elapsed if elapsed > 0 else 0.
+
+
+class Pipeline(object):
+    """
+    Run a sequence of stage functions over a stream of items.
+
+    A stage function takes the output of the previous stage (the source item
+    for the first stage) and returns the input of the next one. The consumer
+    may call `stop()` at any time to end the run early; source items that
+    were already pulled but not yet yielded are then returned by
+    `unfinished()`. An exception raised by a stage is re-raised to the
+    consumer.
+
+    Attributes:
+        stages: List of `(name, fn)` tuples, in execution order
+        queue_size: Capacity of every inter-stage queue. 0 runs all stages
+            inline on the consuming thread, which is handy for debugging
+        stats: List of `StageStats`, one per stage
+        elapsed: Wall time of the last run, in seconds
+    """
+
+    def __init__(self, stages, queue_size=2):
+        """
+        Args:
+            stages (list): `(name, fn)` tuples, in execution order
+            queue_size (int): Capacity of the queue in front of each stage
+
+        Raises:
+            ValueError: If there are no stages or `queue_size` is negative
+        """
+        if len(stages) == 0:
+            raise ValueError("a pipeline needs at least one stage")
+        if queue_size < 0:
+            raise ValueError("queue_size must be >= 0")
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.stats = [StageStats(name, queue_size) for name, _ in self.stages]
+        self.elapsed = 0.
+
+        self._stop_event = threading.Event()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._threads = []
+
+    def run(self, source):
+        """
+        Push every item of `source` through all stages.
+
+        Args:
+            source: Iterable of input items
+
+        Yields:
+            The output of the last stage for each source item, in source order
+        """
+        self._stop_event.clear()
+        self._inflight = {}
+        start = time.time()
+        try:
+            if self.queue_size == 0:
+                for result in self._run_inline(source):
+                    yield result
+            else:
+                for result in self._run_threaded(source):
+                    yield result
+        finally:
+            self.stop()
+            self.elapsed = time.time() - start
+
+    def stop(self):
+        """Stop pulling from the source and shut down all stage workers."""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def unfinished(self):
+        """
+        Source items that entered the pipeline but never left it.
+
+        Returns:
+            list: Source items in source order
+        """
+        with self._inflight_lock:
+            return [self._inflight[seq] for seq in sorted(self._inflight)]
+
+    def bottleneck(self):
+        """
+        Returns:
+            str: Name of the stage with the highest occupancy
+        """
+        best = max(self.stats, key=lambda s: s.busy_time)
+        return best.name
+
+    def report(self):
+        """
+        Returns:
+            str: One line per stage with throughput, occupancy and queue depth
+        """
+        elapsed = self.elapsed
+        lines = []
+        for s in self.stats:
+            lines.append("{:>12s}: {:6d} items, {:7.2f} ms/item, occupancy {:5.1f}%, "
+                         "queue depth avg {:.2f} max {:d}/{:d}".format(
+                             s.name, s.processed, 1000. * s.busy_time / max(s.processed, 1),
+                             100. * s.occupancy(elapsed), s.mean_depth, s.depth_max, s.queue_size))
+        lines.append("{:>12s}: {}".format("bottleneck", self.bottleneck()))
+        return "\n".join(lines)
+
+    def _run_inline(self, source):
+        for seq, item in enumerate(source):
+            self._track(seq, item)
+            if self._stop_event.is_set():
+                return
+            for (_, fn), stats in zip(self.stages, self.stats):
+                tic = time.time()
+                item = fn(item)
+                stats.record(0, time.time() - tic)
+            self._untrack(seq)
+            yield item
+
+    def _run_threaded(self, source):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._threads = [threading.Thread(target=self._feed, args=(source, queues[0]), name="Pipeline-source")]
+        for i, (name, fn) in enumerate(self.stages):
+            self._threads.append(threading.Thread(
+                target=self._work, args=(fn, self.stats[i], queues[i], queues[i + 1]),
+                name="Pipeline-{}".format(name)))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+        out_queue = queues[-1]
+        while True:
+            packet = self._get(out_queue)
+            if packet is None or packet is _END:
+                return
+            if isinstance(packet, _Failure):
+                raise packet.exc
+            seq, item = packet
+            self._untrack(seq)
+            yield item
+
+    def _feed(self, source, out_queue):
+        try:
+            for seq, item in enumerate(source):
+                # tracked first, an item pulled as the pipeline stops is
+                # still returned by `unfinished()`
+                self._track(seq, item)
+                if self._stop_event.is_set():
+                    return
+                if not self._put(out_queue, (seq, item)):
+                    return
+        except Exception as exc:
+            self._put(out_queue, _Failure("source", exc))
+            return
+        self._put(out_queue, _END)
+
+    def _work(self, fn, stats, in_queue, out_queue):
+        while True:
+            depth = in_queue.qsize()
+            packet = self._get(in_queue)
+            if packet is None:
+                return
+            if packet is _END or isinstance(packet, _Failure):
+                self._put(out_queue, packet)
+                return
+            seq, item = packet
+            tic = time.time()
+            try:
+                item = fn(item)
+            except Exception as exc:
+                self._put(out_queue, _Failure(stats.name, exc), force=True)
+                return
+            stats.record(depth, time.time() - tic)
+            if not self._put(out_queue, (seq, item)):
+                return
+
+    def _get(self, q):
+        # returns None once the pipeline is stopped
+        while True:
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return None
+
+    def _put(self, q, packet, force=False):
+        while force or not self._stop_event.is_set():
+            try:
+                q.put(packet, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if force and self._stop_event.is_set():
+                    # nobody downstream is left to drain the queue
+                    return False
+        return False
+
+    def _track(self, seq, item):
+        with self._inflight_lock:
+            self._inflight[seq] = item
+
+    def _untrack(self, seq):
+        with self._inflight_lock:
+            self._inflight.pop(seq, None)
@@ -24,13 +24,17 @@ import os
 import cv2
 import time
 import argparse
+import itertools
 import torch
 import numpy as np
 
-from detector import build_detector
+from detector import build_detector, CascadeDetector, TrackGuidedDetector, MotionGate, MotionGatedDetector, \
+    ResolutionController, AdaptiveResolutionDetector
 from deep_sort import build_tracker
 from utils.draw import draw_boxes
+from utils.frame_reader import FrameReader, POLICIES
 from utils.parser import get_config
+from utils.pipeline import Pipeline
 
 r"""Generate tracking results for videos using Siamese Model"""
 
@@ -93,8 +97,10 @@ class VideoTracker(object):
         cfg: Configuration object containing model parameters
         args: Command line arguments
         vdo: OpenCV video capture object
+        reader: Background frame reader decoding `vdo` ahead of inference
         detector: YOLOv3 detector instance
         deepsort: DeepSORT tracker instance
+        siamese: Siamese tracker following the recognized target
         class_names: List of class names for detection
         writer: Video writer for saving results (if enabled)
         im_width: Video frame width
@@ -123,6 +129,59 @@ class VideoTracker(object):
         self.detector = build_detector(cfg, use_cuda=use_cuda)
         self.deepsort = build_tracker(cfg, use_cuda=use_cuda)
         self.class_names = self.detector.class_names
+        if isinstance(self.detector, CascadeDetector):
+            # new tracks are checked by the accurate detector
+            self.detector.tracker = self.deepsort.tracker
+        elif cfg.YOLOV3.get('DISCOVERY_INTERVAL', 0) > 0:
+            self.detector = TrackGuidedDetector(self.detector, self.deepsort.tracker,
+                                                discovery_interval=cfg.YOLOV3.DISCOVERY_INTERVAL,
+                                                roi_scale=cfg.YOLOV3.get('ROI_SCALE', 2.),
+                                                roi_min_size=cfg.YOLOV3.get('ROI_MIN_SIZE', 96))
+        if cfg.YOLOV3.get('MOTION_GATE', False):
+            gate = MotionGate(width=cfg.YOLOV3.get('MOTION_WIDTH', 320),
+                              pixel_thresh=cfg.YOLOV3.get('MOTION_PIXEL_THRESH', 8),
+                              area_thresh=cfg.YOLOV3.get('MOTION_AREA_THRESH', 0.0005),
+                              max_skip=cfg.YOLOV3.get('MOTION_MAX_SKIP', 15))
+            self.detector = MotionGatedDetector(self.detector, gate)
+        input_sizes = getattr(list(self._detector_chain())[-1], 'input_sizes', ())
+        if len(input_sizes) > 1:
+            controller = ResolutionController(input_sizes, cfg.YOLOV3.get('LATENCY_BUDGET', 0.05),
+                                              min_target_size=cfg.YOLOV3.get('MIN_TARGET_SIZE', 32))
+            self.detector = AdaptiveResolutionDetector(self.detector, controller)
+        self.siamese = SiameseTracker(debug=0)
+        if args.warmup:
+            self.warmup()
+
+    def warmup(self, iterations=3):
+        """
+        Run synthetic inputs through YOLOv3, the ReID extractor and the
+        Siamese tracker, and print their cold and warm timings.
+
+        Their first calls are several times slower than the following ones,
+        which would otherwise land on the frames where a target first
+        appears. Returns once all of them are warm.
+
+        Args:
+            iterations (int): Number of warm calls timed per model
+        """
+        frame_shape = self._frame_shape()
+        yolo = list(self._detector_chain())[-1]
+        if isinstance(yolo, CascadeDetector):
+            detectors = [("yolov3 (fast)", yolo.fast), ("yolov3 (accurate)", yolo.accurate)]
+        else:
+            detectors = [("yolov3", yolo)]
+        timings = [(name, detector.warmup(frame_shape, iterations)) for name, detector in detectors]
+        timings.append(("reid", self.deepsort.warmup(iterations=iterations)))
+        timings.append(("siamese", self.siamese.warmup(frame_shape, iterations)))
+        for name, (cold, warm) in timings:
+            print("warm-up {}: cold {:.1f} ms, warm {:.1f} ms".format(name, 1000 * cold, 1000 * warm))
+
+    def _frame_shape(self):
+        # (height, width) of the video frames, before the video is opened
+        vdo = cv2.VideoCapture(self.args.VIDEO_PATH)
+        shape = int(vdo.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(vdo.get(cv2.CAP_PROP_FRAME_WIDTH))
+        vdo.release()
+        return shape if all(shape) else (480, 640)
 
 
     def __enter__(self):
@@ -147,6 +206,12 @@ class VideoTracker(object):
             self.writer = cv2.VideoWriter(self.args.save_path, fourcc, 20, (self.im_width,self.im_height))
 
         assert self.vdo.isOpened()
+        self.reader = FrameReader(self.vdo, queue_size=self.args.reader_queue_size,
+                                  policy=self.args.reader_policy,
+                                  frame_interval=self.args.frame_interval).start()
+        if isinstance(self.detector, AdaptiveResolutionDetector):
+            # frames decoded but not yet detected
+            self.detector.queue_depth = self.reader.qsize
         return self
 
     
@@ -159,132 +224,190 @@ class VideoTracker(object):
             exc_value: Exception value if any
             exc_traceback: Exception traceback if any
         """
+        self.reader.stop()
+        self.vdo.release()
         if exc_type:
             print(exc_type, exc_value, exc_traceback)
         
-    from goto import with_goto
-    @with_goto
     def run(self):
         """
         Main tracking loop that processes video frames.
         
         This method implements the core tracking pipeline:
-        1. Reads video frames
-        2. Performs object detection using YOLOv3
-        3. Tracks objects using DeepSORT
-        4. Displays or saves results
+        1. Reads video frames decoded ahead of time by the frame reader
+        2. Detects and tracks people with YOLOv3 and DeepSORT until a known
+           face is recognized (see `detect_target`)
+        3. Follows that person with the Siamese tracker (see `track_target`)
         
-        The method uses goto statements for control flow management and
-        processes frames at specified intervals for performance optimization.
+        Frames skipped by `frame_interval` are dropped by the reader without
+        decoding.
         """
-        idx_frame = 0
-        start_tracking = False
-        roi = None
-        
-        diffX = 0
-        diffY = 0
-        count = 1
+        target = self.detect_target()
+        if target is not None:
+            self.track_target(*target)
 
-        while self.vdo.grab(): 
-            idx_frame += 1
-            if idx_frame % self.args.frame_interval:
-                continue
-
-            start = time.time()
-            _, ori_im = self.vdo.retrieve()
-            if(start_tracking == False):
-                im = cv2.cvtColor(ori_im, cv2.COLOR_BGR2RGB)
-
-                # do detection
-                bbox_xywh, cls_conf, cls_ids = self.detector(im)
-                if bbox_xywh is not None:
-                    # select person class
-                    mask = cls_ids==0
-
-                    bbox_xywh = bbox_xywh[mask]
-                    bbox_xywh[:,3:] *= 1.2 # bbox dilation just in case bbox too small
-                    cls_conf = cls_conf[mask]
-
-                    # do tracking
-                    outputs = self.deepsort.update(bbox_xywh, cls_conf, im)
-
-                    # draw boxes for visualization
-                    if len(outputs) > 0:
-                        bbox_xyxy = outputs[:,:4]
-                        identities = outputs[:,-1]
-                        ori_im, roi, start_tracking = draw_boxes(ori_im, bbox_xyxy, identities)
-                        if(start_tracking == True):
-                            tracker = SiameseTracker(debug=0)
-                            time_per_frame = 0
-                            frame = ori_im
-                            frame = preprocess(frame)
-                            r = roi
-                            print('ROI:', r)
-                            tracker.set_first_frame(frame, r)
-                            centerX= r[0] + 0.5 * r[2]
-                            centerY= r[1] + 0.5 * r[3]
-                            goto .start_the_tracking
-            else:
-                label .start_the_tracking
-                #r = postprocess(roi)
-
-                while self.vdo.grab():
-                    
-                    if idx_frame % self.args.frame_interval:
-                        continue
-                    _, ori_im = self.vdo.retrieve()
-                    idx_frame += 1
-
-                    frame = preprocess(ori_im)
-
-                    start_time = datetime.datetime.now()
-                    reported_bbox = tracker.track(frame)
-                    end_time = datetime.datetime.now()
-
-                    if(count == 40):
-                        diffX = (reported_bbox[0] + 0.5 * reported_bbox[2]) - centerX
-                        diffY = (reported_bbox[1] + 0.5 * reported_bbox[3]) - centerY
-            
-                        centerX = reported_bbox[0] + 0.5 * reported_bbox[2]
-                        centerY = reported_bbox[1] + 0.5 * reported_bbox[3]
-
-                        count = 1
+    def detect_target(self):
+        """
+        Run detection, association and rendering as a pipeline.
+        
+        Each stage runs on its own worker with bounded queues in between, so
+        YOLOv3 can work on frame t+1 while DeepSORT associates frame t and
+        the consuming thread encodes frame t-1. Frames leave the pipeline in
+        order, and are only written once they are known not to contain the
+        target, whose frame and the ones after it go to the Siamese tracker.
+        
+        Returns:
+            tuple: `(frame, roi, pending)` for the frame in which the target
+            was recognized, its bounding box and the frames that were already
+            read but not yet processed, or None if the video ended first
+        """
+        if self._detector_uses_tracker():
+            # detection reads the tracks, so it must follow the association of the previous frame
+            track_stages = [("detect+associate", lambda item: self._associate(self._detect(item)))]
+        else:
+            track_stages = [("detect", self._detect), ("associate", self._associate)]
+        pipeline = Pipeline(track_stages + [
+            ("render", self._render),
+        ], queue_size=self.args.pipeline_queue_size)
+
+        target = None
+        last = time.time()
+        for ori_im, roi, start_tracking in pipeline.run(self.reader):
+            now = time.time()
+            print("time: {:.03f}s, fps: {:.03f}".format(now-last, 1/max(now-last, 1e-6)))
+            last = now
+
+            if start_tracking:
+                pipeline.stop()
+                pending = [frame for _, frame in pipeline.unfinished()]
+                target = ori_im, roi, pending
+                break
 
-                        print("(",diffX,",", diffY,") ,")
-                        #trackDrone.track_person(diffX,diffY)
-                    
-                    count = count + 1
+            if self.args.display:
+                cv2.imshow("test", ori_im)
+                cv2.waitKey(1)
 
+            if self.args.save_path:
+                self.writer.write(ori_im)
 
-                    cv2.rectangle(frame, (int(reported_bbox[0]), int(reported_bbox[1])),
-                                (
-                                    int(reported_bbox[0]) + int(reported_bbox[2]),
-                                    int(reported_bbox[1]) + int(reported_bbox[3])),
-                                (0, 0, 255), 2)
-                    
-                    duration = end_time - start_time
-                    time_per_frame = 0.9 * time_per_frame + 0.1 * duration.microseconds
+        print(pipeline.report())
+        for detector in self._detector_chain():
+            if hasattr(detector, 'report'):
+                print(detector.report())
+        return target
+
+    def _detector_chain(self):
+        # the detector and the detectors it wraps
+        detector = self.detector
+        while detector is not None:
+            yield detector
+            detector = getattr(detector, 'detector', None)
+
+    def _detector_uses_tracker(self):
+        return any(getattr(detector, 'uses_tracker', False) for detector in self._detector_chain())
+
+    def _detect(self, item):
+        _, ori_im = item
+        im = cv2.cvtColor(ori_im, cv2.COLOR_BGR2RGB)
+
+        # do detection
+        bbox_xywh, cls_conf, cls_ids = self.detector(im)
+        # skipped by the motion gate, the tracker only predicts this frame
+        skipped = getattr(self.detector, 'last_skipped', False)
+        if bbox_xywh is not None:
+            # select person class
+            mask = cls_ids==0
+
+            bbox_xywh = bbox_xywh[mask]
+            bbox_xywh[:,3:] *= 1.2 # bbox dilation just in case bbox too small
+            cls_conf = cls_conf[mask]
+        return ori_im, im, bbox_xywh, cls_conf, skipped
+
+    def _associate(self, item):
+        ori_im, im, bbox_xywh, cls_conf, skipped = item
+        outputs = []
+        if skipped:
+            outputs = self.deepsort.predict(im)
+        elif bbox_xywh is not None:
+            # do tracking
+            outputs = self.deepsort.update(bbox_xywh, cls_conf, im)
+        return ori_im, outputs
+
+    def _render(self, item):
+        ori_im, outputs = item
+        roi, start_tracking = None, False
+
+        # draw boxes for visualization, on a copy as the source frame may
+        # still be handed to the Siamese tracker by `unfinished()`
+        if len(outputs) > 0:
+            bbox_xyxy = outputs[:,:4]
+            identities = outputs[:,-1]
+            ori_im, roi, start_tracking = draw_boxes(ori_im.copy(), bbox_xyxy, identities)
+        return ori_im, roi, start_tracking
+
+    def track_target(self, ori_im, roi, pending=()):
+        """
+        Follow the recognized target with the Siamese tracker.
+        
+        Args:
+            ori_im (numpy.ndarray): BGR frame in which the target was recognized
+            roi (tuple): Target bounding box `(x, y, w, h)` in that frame
+            pending (list): BGR frames to track before reading new ones
+        """
+        diffX = 0
+        diffY = 0
+        count = 1
 
-                    cv2.putText(frame, 'FPS ' + str(round(1e6 / time_per_frame, 1)),
-                                (30, 50), 0, 1, (0, 0, 255), 3)
+        tracker = self.siamese
+        time_per_frame = 0
+        frame = ori_im
+        frame = preprocess(frame)
+        r = roi
+        print('ROI:', r)
+        tracker.set_first_frame(frame, r)
+        centerX= r[0] + 0.5 * r[2]
+        centerY= r[1] + 0.5 * r[3]
+
+        frames = itertools.chain(pending, (frame for _, frame in self.reader))
+        for ori_im in frames:
+            frame = preprocess(ori_im)
+
+            start_time = datetime.datetime.now()
+            reported_bbox = tracker.track(frame)
+            end_time = datetime.datetime.now()
+
+            if(count == 40):
+                diffX = (reported_bbox[0] + 0.5 * reported_bbox[2]) - centerX
+                diffY = (reported_bbox[1] + 0.5 * reported_bbox[3]) - centerY
+    
+                centerX = reported_bbox[0] + 0.5 * reported_bbox[2]
+                centerY = reported_bbox[1] + 0.5 * reported_bbox[3]
 
-                    if self.args.save_path:
-                        self.writer.write(postprocess(frame))
-                
+                count = 1
 
+                print("(",diffX,",", diffY,") ,")
+                #trackDrone.track_person(diffX,diffY)
+            
+            count = count + 1
 
 
-            end = time.time()
-            print("time: {:.03f}s, fps: {:.03f}".format(end-start, 1/(end-start)))
+            cv2.rectangle(frame, (int(reported_bbox[0]), int(reported_bbox[1])),
+                        (
+                            int(reported_bbox[0]) + int(reported_bbox[2]),
+                            int(reported_bbox[1]) + int(reported_bbox[3])),
+                        (0, 0, 255), 2)
+            
+            duration = end_time - start_time
+            time_per_frame = 0.9 * time_per_frame + 0.1 * duration.microseconds
 
-            if self.args.display:
-                cv2.imshow("test", ori_im)
-                cv2.waitKey(1)
+            cv2.putText(frame, 'FPS ' + str(round(1e6 / time_per_frame, 1)),
+                        (30, 50), 0, 1, (0, 0, 255), 3)
 
             if self.args.save_path:
-                self.writer.write(ori_im)
+                self.writer.write(postprocess(frame))
             
 
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("VIDEO_PATH", type=str)
@@ -292,10 +415,14 @@ def parse_args():
     parser.add_argument("--config_deepsort", type=str, default="./configs/deep_sort.yaml")
     parser.add_argument("--ignore_display", dest="display", action="store_false", default=True)
     parser.add_argument("--frame_interval", type=int, default=1)
+    parser.add_argument("--reader_queue_size", type=int, default=8)
+    parser.add_argument("--reader_policy", type=str, default="block", choices=POLICIES)
+    parser.add_argument("--pipeline_queue_size", type=int, default=2)
     parser.add_argument("--display_width", type=int, default=800)
     parser.add_argument("--display_height", type=int, default=600)
     parser.add_argument("--save_path", type=str, default="./demo/demo.avi")
     parser.add_argument("--cpu", dest="use_cuda", action="store_false", default=True)
+    parser.add_argument("--no_warmup", dest="warmup", action="store_false", default=True)
     return parser.parse_args()
 
 